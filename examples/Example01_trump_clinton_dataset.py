@@ -4,10 +4,14 @@
 # manually and put it in the data folder: TextClassification/examples/data
 # Data source: https://www.kaggle.com/benhamner/clinton-trump-tweets
 
+from text_classification import configure_logging
 from text_classification.preprocessor.csv_preprocessor import CSVPreprocessor
 from text_classification.featurizer.tweet_featurizer import TweetFeaturizer
 from text_classification.classifier.class_average import ClassAverageClassifier
 
+# Print progress of reading data, extracting features and training.
+configure_logging()
+
 # 1) Read in the samples. We are taking 10 % as development set and
 #    20 % as test set.
 preprocessor = CSVPreprocessor(
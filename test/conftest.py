@@ -59,7 +59,7 @@ def featurized_normalized_samples():
 
 
 @pytest.fixture
-def featurizer_added_feature():
+def featurizer_added_feature(tmp_path):
 
     def count_as(instance, exclude=set()):
         counts = Counter(a=0)
@@ -73,14 +73,14 @@ def featurizer_added_feature():
     featurizer.add_feature(count_as)
     featurizer.extract_features(preprocessor)
 
-    featurizer.save("featurizer.bin")
-    loaded_featurizer = TweetFeaturizer.load("featurizer.bin")
+    featurizer.save(str(tmp_path / "featurizer.bin"))
+    loaded_featurizer = TweetFeaturizer.load(str(tmp_path / "featurizer.bin"))
 
     return featurizer, preprocessor, loaded_featurizer
 
 
 @pytest.fixture
-def trained_saved_classifier():
+def trained_saved_classifier(tmp_path):
     preprocessor = CSVPreprocessor(
         train_filename="samples/classifier_train.tsv",
         test_filename="samples/classifier_test.tsv"
@@ -91,14 +91,15 @@ def trained_saved_classifier():
     classifier = ClassAverageClassifier()
     classifier.train(preprocessor)
 
-    classifier.save("classifier.bin")
-    loaded_classifier = ClassAverageClassifier.load("classifier.bin")
+    classifier.save(str(tmp_path / "classifier.bin"))
+    loaded_classifier = ClassAverageClassifier.load(
+        str(tmp_path / "classifier.bin"))
 
     return classifier, preprocessor, loaded_classifier
 
 
 @pytest.fixture
-def trained_saved_vectors_classifier():
+def trained_saved_vectors_classifier(tmp_path):
     preprocessor = CSVPreprocessor(
         train_filename="samples/classifier_train.tsv")
     featurizer = TweetFeaturizer(normalize=False)
@@ -107,8 +108,9 @@ def trained_saved_vectors_classifier():
     classifier = ClassAverageClassifier()
     classifier.train(preprocessor)
 
-    classifier.save_average_feature_vectors("avg_feat_vecs.tsv")
+    classifier.save_average_feature_vectors(
+        str(tmp_path / "avg_feat_vecs.tsv"))
     loaded_classifier = ClassAverageClassifier.load_average_feature_vectors(
-        "avg_feat_vecs.tsv")
+        str(tmp_path / "avg_feat_vecs.tsv"))
 
     return classifier, loaded_classifier
@@ -1,6 +1,10 @@
+import numpy as np
+import pytest
+
 from text_classification.preprocessor.csv_preprocessor import CSVPreprocessor
 from text_classification.featurizer.tweet_featurizer import TweetFeaturizer
 from text_classification.classifier.class_average import ClassAverageClassifier
+from text_classification.preprocessor.feature_matrix import load_feature_matrix
 
 # The following tests test whether ClassAverageClassifier extracts
 # correct average vectors from "samples/classifier_train.tsv". This file
@@ -130,3 +134,155 @@ def test_save_load_avg_vectors_avg_feature_values(
 
     assert classifier._average_feature_values == \
            loaded_classifier._average_feature_values
+
+
+def test_train_from_matrix(trained_saved_classifier):
+    # Test whether training on the featurizer's feature matrix gives the
+    # same average vectors as training on the preprocessor
+    classifier, _, _ = trained_saved_classifier
+    preprocessor = CSVPreprocessor(
+        train_filename="samples/classifier_train.tsv")
+    featurizer = TweetFeaturizer(normalize=False)
+    (train_matrix, _, _), schema = featurizer.extract_feature_matrices(
+        preprocessor, set_instance_features=False)
+
+    labels = [instance["label"] for instance in preprocessor.get_train_data()]
+    matrix_classifier = ClassAverageClassifier().train_from_matrix(
+        train_matrix, labels, schema)
+
+    assert matrix_classifier.labels == classifier.labels
+    assert matrix_classifier.feature_names == classifier.feature_names
+    assert matrix_classifier._average_feature_values == \
+           classifier._average_feature_values
+
+
+def test_predict_from_matrix(trained_saved_classifier):
+    # Test whether predictions on a feature matrix match the predictions
+    # on dicts and ties are broken in favor of the first class
+    classifier, preprocessor, _ = trained_saved_classifier
+    classifier.predict(preprocessor, predict_train=True, predict_test=False)
+    train_set = preprocessor.get_train_data()
+    feature_matrix = np.array([instance["feature_vector"]
+                               for instance in train_set])
+
+    assert classifier.predict_from_matrix(feature_matrix) == \
+           [instance["prediction"] for instance in train_set]
+
+    averages = np.array([classifier._average_feature_values[label]
+                         for label in classifier.labels])
+    assert classifier.predict_from_matrix(averages.mean(axis=0,
+                                                        keepdims=True)) == \
+           [classifier.labels[0]]
+    with pytest.raises(ValueError):
+        classifier.predict_from_matrix(feature_matrix[:, 1:])
+
+
+def test_predict_schema_mismatch(trained_saved_classifier):
+    # Test whether instances with other feature names than the
+    # classifier's are rejected
+    classifier, _, _ = trained_saved_classifier
+    instance = {"feature_vector": [0.0] * len(classifier.feature_names),
+                "feature_names": list(reversed(classifier.feature_names))}
+
+    with pytest.raises(AssertionError):
+        classifier.predict_from_dicts([instance])
+    with pytest.raises(KeyError):
+        classifier.predict_from_dicts([{"text": "unfeaturized"}])
+
+
+def test_partial_train_and_merge(trained_saved_classifier,
+                                 trained_saved_vectors_classifier):
+    # Test whether training on chunks and merging classifiers trained
+    # on different chunks gives the same average vectors as training on
+    # all instances at once
+    classifier, preprocessor, _ = trained_saved_classifier
+    _, loaded_vectors_classifier = trained_saved_vectors_classifier
+    train_set = preprocessor.get_train_data()
+
+    chunked_classifier = ClassAverageClassifier()
+    for instance in train_set:
+        chunked_classifier.partial_train_from_dicts([instance])
+
+    merged_classifier = ClassAverageClassifier().partial_train_from_dicts(
+        train_set[:1])
+    merged_classifier.merge(ClassAverageClassifier().partial_train_from_dicts(
+        train_set[1:]))
+
+    for other_classifier in (chunked_classifier, merged_classifier):
+        assert other_classifier.labels == classifier.labels
+        assert other_classifier.feature_names == classifier.feature_names
+        assert other_classifier._average_feature_values == \
+               classifier._average_feature_values
+
+    # classifiers loaded from average vectors can't be updated
+    with pytest.raises(ValueError):
+        loaded_vectors_classifier.merge(classifier)
+
+
+def test_partial_train_list_feature_names():
+    # Test whether lists of feature names are compared name by name
+    # without computing fingerprints
+    classifier = ClassAverageClassifier()
+    for _ in range(2):
+        classifier.partial_train_from_matrix(np.eye(2), ["0", "1"],
+                                             ["a", "b"])
+
+    assert classifier.feature_names == ["a", "b"]
+    assert classifier.feature_names._fingerprint is None
+    with pytest.raises(ValueError):
+        classifier.partial_train_from_matrix(np.eye(2), ["0", "1"],
+                                             ["b", "a"])
+
+
+def test_train_from_shards(trained_saved_classifier, tmp_path):
+    # Test whether training on shards in worker processes gives the same
+    # average vectors as training in a single process
+    classifier, _, _ = trained_saved_classifier
+    with open("samples/classifier_train.tsv") as file:
+        header, *rows = file.readlines()
+    shards = []
+    for idx, row in enumerate(rows):
+        shard = str(tmp_path / f"shard_{idx}.tsv")
+        with open(shard, "w") as file:
+            file.writelines([header, row])
+        shards.append(shard)
+
+    # featurizers are serialized with dill to be sent to the workers,
+    # also after they have been saved and loaded
+    featurizer_file = str(tmp_path / "featurizer.bin")
+    TweetFeaturizer(normalize=False).save(featurizer_file)
+    cache_filename = str(tmp_path / "annotations.sqlite")
+    for featurizer in (TweetFeaturizer(normalize=False),
+                       TweetFeaturizer.load(featurizer_file),
+                       TweetFeaturizer(normalize=False,
+                                       cache_filename=cache_filename)):
+        shard_classifier = ClassAverageClassifier.train_from_shards(
+            shards, featurizer, n_workers=2, chunk_size=1)
+
+        assert shard_classifier.labels == classifier.labels
+        assert shard_classifier.feature_names == classifier.feature_names
+        assert shard_classifier._average_feature_values == \
+               classifier._average_feature_values
+    # workers don't write to the annotation cache concurrently
+    assert len(featurizer.annotation_cache) == 0
+
+
+def test_train_predict_memory_mapped(trained_saved_classifier, tmp_path):
+    # Test whether training and predicting block by block on
+    # memory-mapped matrices gives the same results as on dicts
+    classifier, preprocessor, _ = trained_saved_classifier
+    preprocessor.write_feature_matrix(str(tmp_path))
+    feature_matrix, labels, feature_names = load_feature_matrix(
+        str(tmp_path), "train", mmap=True)
+
+    mmap_classifier = ClassAverageClassifier().train_from_matrix(
+        feature_matrix, labels, feature_names, block_size=1)
+    assert mmap_classifier.labels == classifier.labels
+    assert mmap_classifier._average_feature_values == \
+           classifier._average_feature_values
+
+    predictions_file = str(tmp_path / "predictions.npy")
+    mmap_classifier.predict_from_matrix(feature_matrix, block_size=1,
+                                        out=predictions_file)
+    assert np.load(predictions_file, mmap_mode="r").tolist() == \
+           classifier.predict_from_matrix(feature_matrix)
@@ -1,3 +1,20 @@
+import copyreg
+import functools
+import gc
+import pickle
+import types
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from text_classification.preprocessor.csv_preprocessor import CSVPreprocessor
+from text_classification.featurizer.base import BaseFeaturizer
+from text_classification.featurizer.tweet_featurizer import TweetFeaturizer
+from text_classification.featurizer.annotation_cache import AnnotationCache
+from text_classification.featurizer.emojis import count_emojis, is_emoji
+from text_classification.featurizer.schema import FeatureSchema
+from text_classification.profiling import Profiler
 
 
 def test_number_of_occurences_alpha_chars(featurized_samples):
@@ -401,6 +418,74 @@ def test_add_feature_instance_without_feature(featurizer_added_feature):
     assert no_a_instance["feature_vector"][a_index] == 0
 
 
+def test_add_feature_varying_keys():
+    # Test whether features returned in varying order are assigned to
+    # the right columns, and varying features raise an error
+    def count_letters(instance, exclude=set()):
+        counts = Counter()
+        for char in sorted(set("ab") - set(instance["text"])):
+            counts[char] = 0
+        for char in instance["text"]:
+            if char in "ab":
+                counts[char] += 1
+        return counts
+
+    def count_words(instance, exclude=set()):
+        return Counter(instance["text"].split())
+
+    featurizer = TweetFeaturizer(normalize=False)
+    featurizer.add_feature(count_letters)
+    data = [{"text": "a a"}, {"text": "a b b"}]
+    featurizer.extract_features_from_dicts(data)
+
+    feature_names = data[1]["feature_names"]
+    assert data[1]["feature_vector"][feature_names.index("a")] == 1
+    assert data[1]["feature_vector"][feature_names.index("b")] == 2
+
+    featurizer.add_feature(count_words)
+    with pytest.raises(ValueError, match="same features"):
+        featurizer.extract_features_from_dicts([{"text": "a"},
+                                                {"text": "a b"}])
+
+
+def count_chars(batch):
+    # Batch feature function counting a's and chars of columnar batches
+    return np.array([[text.lower().count("a"), len(text)]
+                     for text in batch["text"]])
+
+
+def test_add_batch_feature(featurizer_added_feature):
+    # Test whether batch feature functions compute the same features as
+    # per-instance ones, also when run in worker processes
+    _, featurized_preprocessor, _ = featurizer_added_feature
+    expected = [instance["feature_vector"][
+        instance["feature_names"].index("a")]
+        for instance in featurized_preprocessor.get_train_data()]
+
+    for parallel in (False, True):
+        preprocessor = CSVPreprocessor(train_filename="samples/featurizer.tsv")
+        featurizer = TweetFeaturizer(normalize=False, n_process=2,
+                                     batch_size=2)
+        featurizer.add_batch_feature(count_chars, ["a", "chars"],
+                                     required_annotations=set(),
+                                     parallel=parallel, columnar=True)
+        featurizer.extract_features(preprocessor, exclude={"chars"})
+        featurizer.close()
+
+        data = preprocessor.get_train_data()
+        assert data[0]["feature_names"][-1] == "a"
+        assert "chars" not in data[0]["feature_names"]
+        assert [instance["feature_vector"][-1] for instance in data] == \
+               expected
+
+    featurizer = TweetFeaturizer()
+    featurizer.add_batch_feature(lambda batch: np.zeros((len(batch), 1)),
+                                 ["a", "chars"])
+    with pytest.raises(ValueError):
+        featurizer.extract_features(
+            CSVPreprocessor(train_filename="samples/featurizer.tsv"))
+
+
 def test_save_and_load_spacy_model_name(featurizer_added_feature):
     # Test if same spacy model name when saving and loading a featurizer
     featurizer, preprocessor, loaded_featurizer = featurizer_added_feature
@@ -433,3 +518,509 @@ def test_save_and_load_spacy_feature_funcs(featurizer_added_feature):
             for feat, loaded_feat
             in zip(featurizer.feature_functions,
                    loaded_featurizer.feature_functions)])
+
+
+def test_extract_features_from_chunks(featurized_samples):
+    # Test whether featurizing chunk by chunk gives the same feature
+    # vectors as featurizing the whole preprocessor
+    featurizer = TweetFeaturizer(normalize=False)
+    chunks = CSVPreprocessor.iter_chunks("samples/featurizer.tsv",
+                                         chunk_size=2)
+    chunked_vectors = []
+    for chunk in chunks:
+        featurizer.extract_features_from_dicts(chunk)
+        chunked_vectors += [instance["feature_vector"] for instance in chunk]
+
+    assert chunked_vectors == [instance["feature_vector"] for instance
+                               in featurized_samples.get_train_data()]
+
+
+def test_deduplicated_features(featurized_samples):
+    # Test whether instances with duplicate texts get the same feature
+    # vectors as without deduplication
+    texts = [instance["text"] for instance
+             in featurized_samples.get_train_data()]
+    dicts = [{"text": text} for text in texts + texts[::-1]]
+    featurizer = TweetFeaturizer(normalize=False, deduplicate=True,
+                                 keep_annotations=True)
+    featurizer.extract_features_from_dicts(dicts)
+
+    expected_vectors = [instance["feature_vector"] for instance
+                        in featurized_samples.get_train_data()]
+    assert [instance["feature_vector"] for instance in dicts] == \
+           expected_vectors + expected_vectors[::-1]
+    assert dicts[0]["tokens"] == dicts[-1]["tokens"]
+
+
+def test_annotation_cache_reuse(featurized_samples, tmp_path):
+    # Test whether cached annotations give the same feature vectors
+    cache_filename = str(tmp_path / "annotations.sqlite")
+    for _ in range(2):
+        preprocessor = CSVPreprocessor(train_filename="samples/featurizer.tsv")
+        featurizer = TweetFeaturizer(normalize=False,
+                                     cache_filename=cache_filename)
+        featurizer.extract_features(preprocessor)
+
+        assert [instance["feature_vector"] for instance
+                in preprocessor.get_train_data()] == \
+               [instance["feature_vector"] for instance
+                in featurized_samples.get_train_data()]
+    assert len(featurizer.annotation_cache) == 3
+
+
+def test_annotation_cache_lookup_per_batch(featurized_samples, tmp_path):
+    # Test whether the annotation cache is looked up one batch of texts
+    # at a time instead of for all texts at once
+    cache_filename = str(tmp_path / "annotations.sqlite")
+    for _ in range(2):
+        preprocessor = CSVPreprocessor(train_filename="samples/featurizer.tsv")
+        featurizer = TweetFeaturizer(normalize=False, batch_size=1,
+                                     cache_filename=cache_filename)
+        lookups = []
+        get_many = featurizer.annotation_cache.get_many
+
+        def track_get_many(texts, model_key):
+            lookups.append(len(texts))
+            return get_many(texts, model_key)
+
+        featurizer.annotation_cache.get_many = track_get_many
+        featurizer.extract_features(preprocessor)
+
+        assert lookups == [1] * len(preprocessor.get_train_data())
+        assert [instance["feature_vector"] for instance
+                in preprocessor.get_train_data()] == \
+               [instance["feature_vector"] for instance
+                in featurized_samples.get_train_data()]
+
+
+def test_annotation_cache_lru_eviction(tmp_path):
+    # Test whether least recently used annotations are evicted
+    cache = AnnotationCache(str(tmp_path / "annotations.sqlite"),
+                            max_entries=2)
+    cache.put_many({"a": {"tokens": ["a"]}}, "model")
+    cache.put_many({"b": {"tokens": ["b"]}}, "model")
+    cache.get_many(["a"], "model")
+    cache.put_many({"c": {"tokens": ["c"]}}, "model")
+
+    assert cache.get_many(["a", "b", "c"], "model") == {
+        "a": {"tokens": ["a"]}, "c": {"tokens": ["c"]}
+    }
+
+
+def test_disable_unneeded_spacy_components(featurized_samples):
+    # Test whether components for excluded features are not run and
+    # other features stay the same
+    preprocessor = CSVPreprocessor(train_filename="samples/featurizer.tsv")
+    featurizer = TweetFeaturizer(normalize=False, keep_annotations=True)
+    pipe_names = featurizer.spacy_model.pipe_names
+    featurizer.extract_features(preprocessor, exclude={"pos", "ner"})
+
+    instance = preprocessor.get_train_data()[1]
+    expected_instance = featurized_samples.get_train_data()[1]
+    assert "tokens" in instance
+    assert "pos_tags" not in instance and "named_entities" not in instance
+    assert instance["feature_vector"] == \
+           expected_instance["feature_vector"][:len(instance["feature_names"])]
+    assert featurizer.spacy_model.pipe_names == pipe_names
+
+
+def test_worker_pool_reused(featurized_samples):
+    # Test whether annotating in a reused worker pool gives the same
+    # feature vectors as annotating in the main process
+    featurizer = TweetFeaturizer(normalize=False, n_process=2, batch_size=1)
+    pools = []
+    for _ in range(2):
+        preprocessor = CSVPreprocessor(train_filename="samples/featurizer.tsv")
+        featurizer.extract_features(preprocessor)
+        pools.append(featurizer._pool)
+
+        assert [instance["feature_vector"] for instance
+                in preprocessor.get_train_data()] == \
+               [instance["feature_vector"] for instance
+                in featurized_samples.get_train_data()]
+    featurizer.close()
+
+    assert pools[0] is not None and pools[0] is pools[1]
+    assert featurizer._pool is None
+
+
+def test_worker_pool_shut_down(featurized_samples):
+    # Test whether the worker pool is shut down when leaving a with block
+    # and when the featurizer is garbage collected
+    with TweetFeaturizer(normalize=False, n_process=2,
+                         batch_size=1) as featurizer:
+        featurizer.extract_features(
+            CSVPreprocessor(train_filename="samples/featurizer.tsv"))
+        pool = featurizer._pool
+    assert pool is not None and featurizer._pool is None
+    with pytest.raises(ValueError):
+        pool.apply(len, ([],))
+
+    featurizer.extract_features(
+        CSVPreprocessor(train_filename="samples/featurizer.tsv"))
+    pool = featurizer._pool
+    loaded_featurizer = pickle.loads(pickle.dumps(featurizer))
+    del featurizer
+    gc.collect()
+    with pytest.raises(ValueError):
+        pool.apply(len, ([],))
+    assert loaded_featurizer._pool is None
+
+
+def test_char_features_excluded_classes():
+    # Test whether chars of excluded classes are counted for the next
+    # matching class instead
+    featurizer = TweetFeaturizer(normalize=False)
+    instance = {"text": "Ab1 ,c"}
+
+    counts = featurizer._char_based_features(instance)
+    assert counts["alpha"] == 3 and counts["upper"] == 1
+    assert counts["numeric"] == 1 and counts["comma"] == 1
+
+    counts = featurizer._char_based_features(instance,
+                                             exclude={"upper", "comma"})
+    assert counts["alpha"] == 3 and counts["lower"] == 2
+    assert counts["upper"] == 0 and counts["comma"] == 0
+    assert counts["whitespace"] == 1
+
+
+def test_extract_feature_matrices(featurized_samples):
+    # Test whether the batch API returns the same feature values as
+    # the per-instance fields without adding them to the instances
+    preprocessor = CSVPreprocessor(train_filename="samples/featurizer.tsv")
+    featurizer = TweetFeaturizer(normalize=False)
+    matrices, schema = featurizer.extract_feature_matrices(
+        preprocessor, dtype=np.float32, set_instance_features=False)
+
+    train_matrix, test_matrix, dev_matrix = matrices
+    expected_instances = featurized_samples.get_train_data()
+    assert train_matrix.dtype == np.float32
+    assert train_matrix.shape == (len(expected_instances), len(schema))
+    assert test_matrix.shape == (0, len(schema))
+    assert schema == expected_instances[0]["feature_names"]
+    assert np.allclose(train_matrix, [instance["feature_vector"]
+                                      for instance in expected_instances])
+    assert "feature_vector" not in preprocessor.get_train_data()[0]
+
+
+def test_feature_schema():
+    # Test whether FeatureSchema behaves like an immutable list of
+    # feature names
+    schema = FeatureSchema(["alpha", "upper", "lower"])
+
+    assert schema == ["alpha", "upper", "lower"]
+    assert ["alpha", "upper", "lower"] == schema
+    assert schema.index("lower") == 2 and "upper" in schema
+    assert schema[1:] == FeatureSchema(["upper", "lower"])
+    assert pickle.loads(pickle.dumps(schema)) == schema
+    with pytest.raises(ValueError):
+        schema.index("numeric")
+    with pytest.raises(TypeError):
+        schema[0] = "numeric"
+
+
+def test_annotations_not_kept(featurized_samples):
+    # Test whether token-level annotations are only added to instances
+    # if requested and features stay the same
+    preprocessor = CSVPreprocessor(train_filename="samples/featurizer.tsv")
+    featurizer = TweetFeaturizer(normalize=False)
+    featurizer.extract_features(preprocessor)
+
+    instances = preprocessor.get_train_data()
+    assert not any(field in instances[0]
+                   for field in TweetFeaturizer.ANNOTATION_FIELDS)
+    assert [instance["feature_vector"] for instance in instances] == \
+           [instance["feature_vector"] for instance
+            in featurized_samples.get_train_data()]
+
+
+def test_incremental_featurization(featurized_samples):
+    # Test whether only instances without up-to-date feature vector are
+    # featurized in incremental mode
+    preprocessor = CSVPreprocessor(train_filename="samples/featurizer.tsv")
+    featurizer = TweetFeaturizer(normalize=False)
+    featurizer.extract_features(preprocessor, incremental=True)
+    preprocessor.get_train_data().extend(
+        [{"text": instance["text"]} for instance
+         in featurized_samples.get_train_data()])
+
+    featurized_texts = []
+    featurize = featurizer._featurize
+
+    def track_featurize(instances, *args):
+        featurized_texts.extend(instance["text"] for instance in instances)
+        return featurize(instances, *args)
+
+    featurizer._featurize = track_featurize
+    featurizer.extract_features(preprocessor, incremental=True)
+
+    expected_vectors = [instance["feature_vector"] for instance
+                        in featurized_samples.get_train_data()]
+    assert featurized_texts == [instance["text"] for instance
+                                in featurized_samples.get_train_data()]
+    assert [instance["feature_vector"] for instance
+            in preprocessor.get_train_data()] == 2 * expected_vectors
+
+    featurized_texts.clear()
+    featurizer.extract_features(preprocessor, incremental=True)
+    assert featurized_texts == []
+
+    featurizer.normalize = True
+    featurizer.extract_features(preprocessor, incremental=True)
+    assert len(featurized_texts) == len(preprocessor.get_train_data())
+
+
+def test_incremental_featurization_dicts(featurized_samples):
+    # Test whether dictionaries featurized with the same configuration
+    # are skipped in incremental mode
+    dicts = [{"text": instance["text"]} for instance
+             in featurized_samples.get_train_data()]
+    featurizer = TweetFeaturizer(normalize=False)
+    featurizer.extract_features_from_dicts(dicts[:1], incremental=True)
+    first_vector = dicts[0]["feature_vector"]
+    featurizer.extract_features_from_dicts(dicts, incremental=True)
+
+    assert dicts[0]["feature_vector"] is first_vector
+    assert [instance["feature_vector"] for instance in dicts] == \
+           [instance["feature_vector"] for instance
+            in featurized_samples.get_train_data()]
+    assert dicts[0]["feature_fingerprint"] == featurizer.fingerprint()
+
+    # fingerprints are only stored in incremental mode
+    featurizer.extract_features_from_dicts(dicts)
+    assert "feature_fingerprint" not in dicts[0]
+
+
+def test_fingerprint_partial_and_lambda_features():
+    # Test whether partials, callable objects and lambdas can be used as
+    # feature functions and are told apart by the fingerprint
+    def count_char(instance, exclude=set(), char="a"):
+        return Counter({char: instance["text"].count(char)})
+
+    class CountChar:
+        def __call__(self, instance, exclude=set()):
+            return Counter({"b": instance["text"].count("b")})
+
+    featurizer = TweetFeaturizer(normalize=False)
+    featurizer.add_feature(functools.partial(count_char, char="x"))
+    featurizer.add_feature(CountChar())
+    dicts = [{"text": "xxb"}]
+    featurizer.extract_features_from_dicts(dicts, incremental=True)
+
+    feature_names = dicts[0]["feature_names"]
+    assert dicts[0]["feature_vector"][feature_names.index("x")] == 2
+    assert dicts[0]["feature_vector"][feature_names.index("b")] == 1
+
+    fingerprints = set()
+    for function in (lambda instance, exclude=set(): Counter(a=1),
+                     lambda instance, exclude=set(): Counter(b=1)):
+        featurizer = TweetFeaturizer(normalize=False)
+        featurizer.add_feature(function)
+        fingerprints.add(featurizer.fingerprint())
+    assert len(fingerprints) == 2
+
+
+def test_load_spacy_model_lazily(featurized_samples, tmp_path):
+    # Test whether saved featurizers don't contain the spaCy model and
+    # load it on first use, also from a bundled model
+    featurizer = TweetFeaturizer(normalize=False)
+    for bundle_model in (False, True):
+        filename = str(tmp_path / f"featurizer_{bundle_model}.bin")
+        featurizer.save(filename, bundle_model=bundle_model)
+        loaded_featurizer = TweetFeaturizer.load(filename)
+
+        assert loaded_featurizer._spacy_model is None
+        assert loaded_featurizer.model_version == featurizer.model_version
+        assert (loaded_featurizer._model_bundle is not None) == bundle_model
+
+        preprocessor = CSVPreprocessor(train_filename="samples/featurizer.tsv")
+        loaded_featurizer.extract_features(preprocessor)
+        assert [instance["feature_vector"] for instance
+                in preprocessor.get_train_data()] == \
+               [instance["feature_vector"] for instance
+                in featurized_samples.get_train_data()]
+
+
+def test_load_copied_feature_functions(featurized_samples):
+    # Test whether built-in feature functions are recognized after
+    # loading if dill restores them as copies of the saved functions,
+    # as dill 0.3.2 does
+    featurizer = TweetFeaturizer(normalize=False)
+    state = featurizer.__getstate__()
+    loaded_featurizer = TweetFeaturizer.__new__(TweetFeaturizer)
+    state["feature_functions"] = [
+        types.MethodType(types.FunctionType(
+            function.__code__, function.__globals__, function.__name__),
+            loaded_featurizer)
+        for function in featurizer.feature_functions
+    ]
+    loaded_featurizer.__setstate__(state)
+
+    preprocessor = CSVPreprocessor(train_filename="samples/featurizer.tsv")
+    loaded_featurizer.extract_features(preprocessor)
+    assert [instance["feature_vector"] for instance
+            in preprocessor.get_train_data()] == \
+           [instance["feature_vector"] for instance
+            in featurized_samples.get_train_data()]
+
+
+class _BaselineFeaturizer:
+    # Pickles like a TweetFeaturizer saved by the first version of the
+    # library, which only had the attributes in the given state.
+
+    def __init__(self, state):
+        self.state = state
+
+    def __reduce__(self):
+        return copyreg._reconstructor, (TweetFeaturizer, object, None), \
+            self.state
+
+
+def test_load_baseline_featurizer(featurized_samples, tmp_path):
+    # Test whether featurizers saved by the first version of the library
+    # can be loaded and used to extract features
+    import dill
+
+    state = {"spacy_model": TweetFeaturizer(
+                 emoji_backend="spacymoji").spacy_model,
+             "normalize": False}
+    baseline_featurizer = _BaselineFeaturizer(state)
+    state["feature_functions"] = [
+        types.MethodType(getattr(TweetFeaturizer, name), baseline_featurizer)
+        for name in ("_char_based_features", "_word_based_features",
+                     "_pos_features", "_ner_features")
+    ]
+    filename = str(tmp_path / "baseline_featurizer.bin")
+    with open(filename, "wb") as file:
+        dill.dump(baseline_featurizer, file)
+
+    loaded_featurizer = TweetFeaturizer.load(filename)
+    preprocessor = CSVPreprocessor(train_filename="samples/featurizer.tsv")
+    loaded_featurizer.extract_features(preprocessor)
+    assert loaded_featurizer.lang_model == "en_core_web_sm"
+    assert [instance["feature_vector"] for instance
+            in preprocessor.get_train_data()] == \
+           [instance["feature_vector"] for instance
+            in featurized_samples.get_train_data()]
+
+
+def test_count_emojis():
+    # Test whether emojis consisting of multiple code points are counted
+    # once by the built-in emoji detection
+    assert count_emojis("😂 Mr. Smith has been living in Paris. 😛") == 2
+    assert count_emojis("\U0001F469\u200D\U0001F4BB \U0001F44D\U0001F3FD") == 2
+    assert count_emojis("\U0001F1E9\U0001F1EA 1\uFE0F\u20E3") == 2
+    assert count_emojis("#hashtag 123 :)") == 0
+    assert is_emoji("😛") and not is_emoji("a😛")
+    # symbols that aren't emoji and lone components
+    for text in ("★", "✓", "☐", "\U0001F130", "\U0001F1E9", "\U0001F3FD"):
+        assert count_emojis(text) == 0
+
+
+def test_emoji_backends(featurized_samples):
+    # Test whether the built-in emoji detection counts the same emojis
+    # as spacymoji
+    preprocessor = CSVPreprocessor(train_filename="samples/featurizer.tsv")
+    featurizer = TweetFeaturizer(normalize=False, emoji_backend="spacymoji")
+    featurizer.extract_features(preprocessor)
+
+    assert "emoji" in featurizer.spacy_model.pipe_names
+    assert [instance["feature_vector"] for instance
+            in preprocessor.get_train_data()] == \
+           [instance["feature_vector"] for instance
+            in featurized_samples.get_train_data()]
+    with pytest.raises(ValueError):
+        TweetFeaturizer(emoji_backend="unknown")
+
+
+def test_emoji_backends_symbols():
+    # Test whether symbols that aren't emoji, lone regional indicators
+    # and lone skin tone modifiers are neither counted by the built-in
+    # emoji detection nor by spacymoji
+    texts = ["I ★ it ✓", "☐ \U0001F130", "\U0001F1E9 and \U0001F3FD",
+             "😂 👍"]
+    counts = {}
+    for emoji_backend in ("builtin", "spacymoji"):
+        featurizer = TweetFeaturizer(normalize=False,
+                                     emoji_backend=emoji_backend)
+        dicts = featurizer.extract_features_from_dicts(
+            [{"text": text} for text in texts])
+        counts[emoji_backend] = [
+            instance["feature_vector"][
+                instance["feature_names"].index("emojis")]
+            for instance in dicts]
+
+    assert counts["builtin"] == counts["spacymoji"] == [0, 0, 0, 2]
+
+
+def test_profiling():
+    # Test whether spaCy and each feature function are profiled with the
+    # number of featurized instances
+    preprocessor = CSVPreprocessor(train_filename="samples/featurizer.tsv")
+    featurizer = TweetFeaturizer(deduplicate=False)
+    profiler = Profiler()
+    featurizer.extract_features(preprocessor, profiler=profiler)
+
+    n_instances = len(preprocessor.get_train_data())
+    metrics = profiler.metrics
+    assert metrics["spacy"]["instances"] == n_instances
+    for function in featurizer.feature_functions:
+        stage = f"feature_function:{function.__name__}"
+        assert metrics[stage]["calls"] == n_instances
+        assert metrics[stage]["wall_time"] >= 0
+
+
+def test_tokenizer_only(featurized_samples):
+    # Test whether tokenizer-only mode extracts the same char-based and
+    # word-based features without running the spaCy pipeline
+    preprocessor = CSVPreprocessor(train_filename="samples/featurizer.tsv")
+    featurizer = TweetFeaturizer(normalize=False, tokenizer_only=True)
+    featurizer.extract_features(preprocessor)
+
+    schema = featurizer.feature_schema()
+    assert list(schema) == list(TweetFeaturizer.CHAR_FEATURES) + \
+        ["stop_words", "emojis", "token_counts", "avg_token_len"]
+    for instance, expected_instance in zip(
+            preprocessor.get_train_data(),
+            featurized_samples.get_train_data()):
+        assert instance["feature_names"] == schema
+        assert instance["feature_vector"] == [
+            expected_instance["feature_vector"][
+                expected_instance["feature_names"].index(name)]
+            for name in schema]
+
+    with pytest.raises(ValueError):
+        featurizer.add_feature(len, required_annotations={"pos_tags"})
+    with pytest.raises(ValueError):
+        TweetFeaturizer(tokenizer_only=True, emoji_backend="spacymoji")
+
+
+def test_feature_schema_without_extraction(featurized_samples, tmp_path):
+    # Test whether the feature schema is derived without annotating any
+    # text and can't be derived for custom feature functions
+    featurizer = TweetFeaturizer(
+        normalize=False, cache_filename=str(tmp_path / "annotations.sqlite"))
+    featurizer.add_batch_feature(count_chars, ["a_count", "char_count"])
+    schema = featurizer.feature_schema(exclude={"pos", "a_count"})
+
+    expected_instance = featurized_samples.get_train_data()[0]
+    assert schema == [name for name in expected_instance["feature_names"]
+                      if name not in BaseFeaturizer.COARSE_POS_TAGS] + \
+        ["char_count"]
+    assert len(featurizer.annotation_cache) == 0
+
+    featurizer.add_feature(len)
+    with pytest.raises(ValueError):
+        featurizer.feature_schema()
+
+
+def test_feature_schema_fingerprint():
+    # Test whether FeatureSchemas are compared by their fingerprints
+    schema = FeatureSchema(["alpha", "upper"])
+
+    assert schema.fingerprint == FeatureSchema(("alpha", "upper")).fingerprint
+    assert schema.fingerprint != FeatureSchema(["upper", "alpha"]).fingerprint
+    assert schema == FeatureSchema(["alpha", "upper"])
+    assert schema != FeatureSchema(["alpha"])
+    assert FeatureSchema.from_names(schema) is schema
+    assert hash(schema) == hash(pickle.loads(pickle.dumps(schema)))
@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import text_classification
+
+# dependencies that should only be imported when they are used
+HEAVY_MODULES = ("spacy", "spacymoji", "sklearn", "dill")
+
+
+def _import_in_subprocess(module):
+    # Imports a module in a fresh interpreter and returns the heavy
+    # modules imported along with it and the number of handlers of the
+    # root logger.
+    code = (f"import logging, sys\n"
+            f"import {module}\n"
+            f"print(','.join(name for name in {HEAVY_MODULES!r} "
+            f"if name in sys.modules))\n"
+            f"print(len(logging.getLogger().handlers))")
+    package_root = os.path.dirname(os.path.dirname(
+        os.path.abspath(text_classification.__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [package_root, os.environ.get("PYTHONPATH", "")]))
+    result = subprocess.run([sys.executable, "-c", code], env=env,
+                            stdout=subprocess.PIPE, universal_newlines=True,
+                            check=True)
+    imported_modules, handlers = result.stdout.splitlines()
+
+    return [name for name in imported_modules.split(",") if name], \
+        int(handlers)
+
+
+@pytest.mark.parametrize("module", [
+    "text_classification.preprocessor.csv_preprocessor",
+    "text_classification.featurizer.tweet_featurizer",
+    "text_classification.classifier.class_average",
+    "text_classification.utils",
+])
+def test_no_heavy_imports(module):
+    # Test whether importing a module doesn't import heavy dependencies
+    # or configure logging
+    imported_modules, handlers = _import_in_subprocess(module)
+
+    assert imported_modules == []
+    assert handlers == 0
@@ -1,4 +1,15 @@
+import bz2
+import gzip
+import lzma
+import pathlib
+import pickle
+import random
+
+import numpy as np
+import pytest
+
 from text_classification.preprocessor.csv_preprocessor import CSVPreprocessor
+from text_classification.preprocessor.sample_store import SampleStore
 
 
 def test_read_data(sample_csv_preprocessor):
@@ -80,3 +91,254 @@ def test_test_split_additional_data(split_csv_preprocessor_additional_data):
 def test_dev_split_additional_data(split_csv_preprocessor_additional_data):
     # Test Whether train split is made correctly with additional data
     assert len(split_csv_preprocessor_additional_data.get_dev_data()) == 11
+
+
+def test_iter_chunks_sizes():
+    # Test whether streamed chunks have the requested size
+    chunks = list(CSVPreprocessor.iter_chunks("samples/sample_data.tsv",
+                                              chunk_size=4))
+
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+
+
+def test_iter_chunks_content(sample_csv_preprocessor):
+    # Test whether streamed chunks contain all samples in file order
+    chunks = CSVPreprocessor.iter_chunks("samples/sample_data.tsv",
+                                         chunk_size=3)
+    streamed_data = [instance for chunk in chunks for instance in chunk]
+
+    assert streamed_data == sample_csv_preprocessor.get_train_data()
+
+
+def test_sample_store_columns(sample_csv_preprocessor):
+    # Test whether samples are stored column-wise
+    train_set = sample_csv_preprocessor.get_train_data()
+
+    assert isinstance(train_set, SampleStore)
+    assert train_set.column("text")[:2] == ["text 1", "text 2"]
+    assert train_set.column("label")[:2] == ["0", "1"]
+
+
+def test_sample_store_feature_matrix(sample_csv_preprocessor):
+    # Test whether feature vectors are stored in a single matrix and
+    # are accessible through the instance views
+    train_set = sample_csv_preprocessor.get_train_data()
+    train_set.set_features(np.arange(20).reshape(10, 2), ["a", "b"])
+
+    assert train_set[3]["feature_vector"] == [6, 7]
+    assert train_set[3]["feature_names"] == ["a", "b"]
+
+
+def test_sample_store_instance_view_write(sample_csv_preprocessor):
+    # Test whether writing to an instance view updates the columns
+    train_set = sample_csv_preprocessor.get_train_data()
+    train_set[1]["prediction"] = "1"
+
+    assert train_set.column("prediction")[:3] == [None, "1", None]
+    assert "prediction" not in train_set[0]
+
+
+def test_sample_store_pickle_missing_fields(sample_csv_preprocessor):
+    # Test whether unset fields are still recognized after pickling
+    train_set = sample_csv_preprocessor.get_train_data()
+    train_set[1]["prediction"] = "1"
+    train_set = pickle.loads(pickle.dumps(train_set))
+
+    assert train_set.column("prediction")[:2] == [None, "1"]
+    assert "prediction" not in train_set[0]
+
+
+def test_sample_store_extend_unfeaturized():
+    # Test whether featurized and unfeaturized instances can be combined
+    store = SampleStore.from_dicts([
+        {"text": "a", "feature_vector": [1, 2], "feature_names": ["x", "y"]}
+    ])
+    store += [{"text": "b"}]
+
+    assert list(store.is_featurized()) == [True, False]
+    assert "feature_vector" not in store[1]
+
+
+def test_sample_store_append_many():
+    # Test whether appending one instance at a time keeps all columns and
+    # feature vectors when the underlying buffers grow
+    store = SampleStore()
+    for idx in range(100):
+        if idx % 2:
+            store.append({"text": str(idx), "label": "0"})
+        else:
+            store.append({"text": str(idx), "feature_vector": [idx, 1],
+                          "feature_names": ["x", "y"]})
+
+    assert len(store) == 100
+    assert store.feature_matrix.shape == (100, 2)
+    assert store.column("text") == [str(idx) for idx in range(100)]
+    assert store.column("label")[:2] == [None, "0"]
+    assert list(store.is_featurized()) == [True, False] * 50
+    assert store[98]["feature_vector"] == [98, 1]
+
+
+def test_write_feature_vectors(sample_csv_preprocessor, tmp_path):
+    # Test whether feature vectors are written to the csv-file
+    train_set = sample_csv_preprocessor.get_train_data()
+    train_set.set_features(np.arange(20).reshape(10, 2), ["a", "b"])
+    filename = str(tmp_path / "feature_vectors.tsv")
+    sample_csv_preprocessor.write_feature_vectors(filename)
+
+    with open(filename) as file:
+        rows = [line.rstrip("\n").split("\t") for line in file]
+
+    assert rows[0] == ["text", "label", "prediction", "a", "b"]
+    assert rows[2] == ["text 2", "1", "", "2", "3"]
+
+
+def test_write_load_feature_matrix(split_csv_preprocessor, tmp_path):
+    # Test whether binary feature matrices are loaded memory-mapped
+    # with the same feature vectors, labels and feature names
+    for split in split_csv_preprocessor.get_data():
+        split.set_features(np.random.rand(len(split), 3), ["a", "b", "c"])
+    for set in ("train", "test", "dev"):
+        split_csv_preprocessor.write_feature_matrix(str(tmp_path), set=set)
+
+    loaded = CSVPreprocessor.from_feature_matrix(str(tmp_path))
+
+    for split, loaded_split in zip(split_csv_preprocessor.get_data(),
+                                   loaded.get_data()):
+        assert isinstance(loaded_split.feature_matrix, np.memmap)
+        assert np.array_equal(split.feature_matrix,
+                              loaded_split.feature_matrix)
+        assert loaded_split.column("label") == split.column("label")
+        assert loaded_split.feature_names == ["a", "b", "c"]
+
+
+def test_write_feature_matrix_without_labels(split_csv_preprocessor,
+                                            tmp_path):
+    # Test whether feature matrices of instances without label are
+    # written without labels
+    train_set = split_csv_preprocessor.get_train_data()
+    train_set.set_features(np.ones((len(train_set), 2)), ["a", "b"])
+    train_set.delete_column("label")
+    split_csv_preprocessor.write_feature_matrix(str(tmp_path), set="train")
+
+    loaded_set = CSVPreprocessor.from_feature_matrix(
+        str(tmp_path)).get_train_data()
+    assert "label" not in loaded_set[0]
+    assert np.array_equal(loaded_set.feature_matrix, train_set.feature_matrix)
+
+
+def _write_shards(directory, number_of_shards, rows_per_shard):
+    for shard in range(number_of_shards):
+        with open(directory / f"shard_{shard}.tsv", "w") as file:
+            file.write("text\tlabel\n")
+            for row in range(rows_per_shard):
+                file.write(f"shard {shard} row {row}\t{row % 2}\n")
+
+
+def test_read_shards_glob_parallel(tmp_path):
+    # Test whether shards matching a glob pattern are read in parallel
+    # and merged in deterministic order
+    _write_shards(tmp_path, 3, 4)
+    preprocessor = CSVPreprocessor(train_filename=str(tmp_path / "*.tsv"),
+                                   n_workers=2)
+
+    assert preprocessor.get_train_data().column("text") == \
+           [f"shard {shard} row {row}" for shard in range(3)
+            for row in range(4)]
+
+
+def test_read_shards_list_max_rows(tmp_path):
+    # Test whether the number of rows read per shard can be limited
+    _write_shards(tmp_path, 3, 4)
+    preprocessor = CSVPreprocessor(
+        train_filename=[str(tmp_path / "shard_2.tsv"),
+                        str(tmp_path / "shard_0.tsv")],
+        max_rows_per_shard=2
+    )
+
+    assert preprocessor.get_train_data().column("text") == \
+           ["shard 2 row 0", "shard 2 row 1", "shard 0 row 0", "shard 0 row 1"]
+
+
+def test_read_path(sample_csv_preprocessor, tmp_path):
+    # Test whether filenames can be given as path objects
+    preprocessor = CSVPreprocessor(
+        train_filename=pathlib.Path("samples/sample_data.tsv"))
+    _write_shards(tmp_path, 2, 1)
+    shard_preprocessor = CSVPreprocessor(
+        train_filename=[tmp_path / "shard_1.tsv", tmp_path / "shard_0.tsv"])
+
+    assert preprocessor.get_train_data() == \
+        sample_csv_preprocessor.get_train_data()
+    assert shard_preprocessor.get_train_data().column("text") == \
+        ["shard 1 row 0", "shard 0 row 0"]
+
+
+def test_hash_split_order_independent(tmp_path):
+    # Test whether hash-based splits don't depend on the order of the
+    # samples
+    _write_shards(tmp_path, 2, 50)
+    shards = [str(tmp_path / "shard_0.tsv"), str(tmp_path / "shard_1.tsv")]
+    preprocessor = CSVPreprocessor(train_filename=shards, test_split=0.2,
+                                   dev_split=0.1, split_mode="hash")
+    reversed_preprocessor = CSVPreprocessor(train_filename=shards[::-1],
+                                            test_split=0.2, dev_split=0.1,
+                                            split_mode="hash")
+
+    for split, reversed_split in zip(preprocessor.get_data(),
+                                     reversed_preprocessor.get_data()):
+        assert sorted(split.column("text")) == \
+               sorted(reversed_split.column("text"))
+    assert 0 < len(preprocessor.get_test_data()) < 40
+    assert 0 < len(preprocessor.get_dev_data()) < 30
+
+
+def test_hash_split_global_random_state():
+    # Test whether splitting samples leaves the global random state alone
+    random.seed(0)
+    state = random.getstate()
+    CSVPreprocessor(train_filename="samples/sample_data.tsv", test_split=0.2,
+                    random_state=1)
+    CSVPreprocessor(train_filename="samples/sample_data.tsv", test_split=0.2,
+                    split_mode="hash")
+
+    assert random.getstate() == state
+
+
+def test_read_compressed_files(sample_csv_preprocessor, tmp_path):
+    # Test whether compressed files are detected by extension and by
+    # content
+    with open("samples/sample_data.tsv", "rb") as file:
+        content = file.read()
+    with gzip.open(tmp_path / "sample_data.tsv.gz", "wb") as file:
+        file.write(content)
+    with bz2.open(tmp_path / "sample_data.tsv", "wb") as file:
+        file.write(content)
+
+    for filename in ("sample_data.tsv.gz", "sample_data.tsv"):
+        preprocessor = CSVPreprocessor(train_filename=str(tmp_path / filename))
+        assert preprocessor.get_train_data() == \
+               sample_csv_preprocessor.get_train_data()
+
+
+def test_write_compressed_csv(sample_csv_preprocessor, tmp_path):
+    # Test whether samples are compressed when writing to a .xz-file
+    for filename in (str(tmp_path / "samples.tsv.xz"),
+                     tmp_path / "samples_path.tsv.xz"):
+        sample_csv_preprocessor.write_csv(filename, set="train")
+
+        with lzma.open(filename, "rt") as file:
+            assert file.readline().strip() == "text\tlabel\tprediction"
+
+
+def test_sample_store_set_column():
+    # Test whether a field can be set for all instances at once
+    store = SampleStore.from_dicts([{"text": "a"}, {"text": "b"}])
+    store.set_column("prediction", ["0", "1"])
+
+    assert store.to_dicts() == [{"text": "a", "prediction": "0"},
+                                {"text": "b", "prediction": "1"}]
+    with pytest.raises(ValueError):
+        store.set_column("prediction", ["0"])
+
+    store.delete_column("prediction")
+    assert store.to_dicts() == [{"text": "a"}, {"text": "b"}]
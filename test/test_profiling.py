@@ -0,0 +1,82 @@
+import time
+
+from text_classification.profiling import Profiler, NullProfiler, \
+    get_profiler
+
+
+def test_stage():
+    # Test whether runs of a stage are accumulated and passed to the
+    # callback
+    runs = []
+    profiler = Profiler(callback=lambda name, metrics: runs.append(name))
+    for _ in range(2):
+        with profiler.stage("read", instances=5):
+            time.sleep(0.01)
+    with profiler.stage("train") as stage:
+        stage.instances = 20
+
+    metrics = profiler.metrics
+    assert runs == ["read", "read", "train"]
+    assert metrics["read"]["calls"] == 2
+    assert metrics["read"]["instances"] == 10
+    assert metrics["read"]["wall_time"] >= 0.02
+    assert metrics["read"]["instances_per_second"] > 0
+    assert metrics["read"]["peak_memory"] is None
+    assert metrics["train"]["instances"] == 20
+    assert "train" in profiler.report()
+
+    profiler.reset()
+    assert profiler.metrics == {}
+
+
+def test_wrap_and_iterate():
+    # Test whether calls of a wrapped function and items of a wrapped
+    # iterable are counted
+    profiler = Profiler()
+    square = profiler.wrap("square", lambda value: value ** 2)
+    items = list(profiler.iterate("items", (square(value)
+                                            for value in range(3))))
+
+    assert items == [0, 1, 4]
+    assert profiler.metrics["square"]["calls"] == 3
+    assert profiler.metrics["items"]["calls"] == 3
+    assert profiler.metrics["items"]["instances"] == 3
+
+
+def test_trace_memory():
+    # Test whether the peak memory of nested stages is measured
+    profiler = Profiler(trace_memory=True)
+    with profiler.stage("outer"):
+        with profiler.stage("inner"):
+            data = bytearray(10 ** 6)
+        del data
+
+    assert profiler.metrics["inner"]["peak_memory"] >= 10 ** 6
+    assert profiler.metrics["outer"]["peak_memory"] >= 10 ** 6
+
+
+def test_trace_memory_peak_reset():
+    # Test whether the peak memory of a stage doesn't include memory
+    # allocated and freed before the stage started
+    profiler = Profiler(trace_memory=True)
+    with profiler.stage("outer"):
+        data = bytearray(10 ** 7)
+        del data
+        with profiler.stage("inner"):
+            data = bytearray(10 ** 5)
+
+    assert 10 ** 5 <= profiler.metrics["inner"]["peak_memory"] < 10 ** 6
+    assert profiler.metrics["outer"]["peak_memory"] >= 10 ** 7
+
+
+def test_null_profiler():
+    # Test whether no profiler results in a NullProfiler not measuring
+    # anything
+    profiler = get_profiler(None)
+    with profiler.stage("read"):
+        pass
+    function = profiler.wrap("function", len)
+
+    assert isinstance(profiler, NullProfiler)
+    assert function is len
+    assert profiler.metrics == {}
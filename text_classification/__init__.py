@@ -1,7 +1,18 @@
 import logging
 
-logging.basicConfig(
-    format="%(asctime)s - %(levelname)s - %(name)s -   %(message)s",
-    datefmt="%m/%d/%Y %H:%M:%S",
-    level=logging.INFO,
-)
+
+def configure_logging(level=logging.INFO):
+    """
+    Configures the root logger to print the library's log messages,
+    e.g. progress of reading data and extracting features. Importing the
+    library doesn't configure logging, such that applications using it
+    keep control over their logging setup.
+
+    :param level: Minimum level of messages to print.
+    :type level: int
+    """
+    logging.basicConfig(
+        format="%(asctime)s - %(levelname)s - %(name)s -   %(message)s",
+        datefmt="%m/%d/%Y %H:%M:%S",
+        level=level,
+    )
@@ -1,7 +1,5 @@
 from abc import ABC, abstractmethod
 
-import dill
-
 
 class BaseClassifier(ABC):
     """
@@ -64,6 +62,8 @@ class BaseClassifier(ABC):
             saved.
         :type filename: str
         """
+        import dill
+
         with open(filename, "wb") as file:
             dill.dump(self, file)
 
@@ -78,6 +78,8 @@ class BaseClassifier(ABC):
 
         :return: Classifier instance.
         """
+        import dill
+
         with open(filename, "rb") as file:
             classifier = dill.load(file)
 
@@ -1,13 +1,23 @@
 import logging
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import csv
 
-from sklearn.metrics import classification_report
+import numpy as np
 
 from text_classification.classifier.base import BaseClassifier
+from text_classification.featurizer.schema import FeatureSchema
+from text_classification.preprocessor.csv_preprocessor import CSVPreprocessor
+from text_classification.preprocessor.sample_store import SampleStore
+from text_classification.profiling import get_profiler
+from text_classification.utils import available_cpus
 
 logger = logging.getLogger(__name__)
 
+# maximum number of elements of the distance arrays computed at once
+# when predicting, bounding the memory needed for large batches
+_PREDICTION_CHUNK_ELEMENTS = 2 ** 22
+
 
 class ClassAverageClassifier(BaseClassifier):
     """
@@ -17,12 +27,16 @@ class ClassAverageClassifier(BaseClassifier):
     """
 
     def __init__(self):
-        self.feature_names = []
+        self.feature_names = FeatureSchema()
         self.labels = []
 
         self._average_feature_values = dict()
+        # sum of the feature vectors and number of train instances of
+        # each class, from which the average feature vectors are computed
+        self._class_sums = dict()
+        self._class_counts = dict()
 
-    def train(self, preprocessor):
+    def train(self, preprocessor, profiler=None):
         """
         Computes the average feature vector for each class in the pre-
         processor's train set.
@@ -32,8 +46,12 @@ class ClassAverageClassifier(BaseClassifier):
             should contain the keys "feature_vector", "feature_names"
             and "label".
         :type preprocessor: BasePreprocessor
+        :param profiler: Profiler measuring the time spent training
+            (stage "train") and evaluating on the dev set.
+        :type profiler: Profiler
         :return: ClassAverageClassifier
         """
+        profiler = get_profiler(profiler)
         train_set = preprocessor.get_train_data()
         if not train_set:
             logger.warning("Classifier won't be trained as Preprocessor's "
@@ -42,35 +60,234 @@ class ClassAverageClassifier(BaseClassifier):
 
         logger.info(f"Training the classifier on {len(train_set)} training "
                     f"instances...")
-        # split train set in different classes
-        split_by_label = defaultdict(list)
-        for instance in train_set:
-            split_by_label[instance["label"]].append(instance)
-        self.labels = list(split_by_label.keys())
-
-        # calculate average feature vector for each class
-        for label in split_by_label:
-            # group features values of same feature together
-            grouped_feature_values = zip(
-                *[instance["feature_vector"]
-                  for instance in split_by_label[label]]
-            )
-            self._average_feature_values[label] = [sum(feature) /
-                                                   len(split_by_label[label])
-                                                   for feature
-                                                   in grouped_feature_values]
-
-        self.feature_names = train_set[0]["feature_names"]
+        with profiler.stage("train", len(train_set)):
+            feature_matrix, feature_names = \
+                self._get_feature_matrix(train_set)
+            if isinstance(train_set, SampleStore):
+                labels = train_set.column("label")
+            else:
+                labels = [instance["label"] for instance in train_set]
+            self.train_from_matrix(feature_matrix, labels, feature_names)
 
         logger.info("Training done.")
 
         # evaluate on dev set
         if preprocessor.get_dev_data():
-            self.evaluate(preprocessor, evaluate_test=False, evaluate_dev=True)
+            self.evaluate(preprocessor, evaluate_test=False, evaluate_dev=True,
+                          profiler=profiler)
+
+        return self
+
+    def train_from_matrix(self, feature_matrix, labels, feature_names,
+                          block_size=None):
+        """
+        Computes the average feature vector for each class from a dense
+        feature matrix, e.g. as returned by
+        :code:`TweetFeaturizer.extract_feature_matrices` or a
+        memory-mapped matrix loaded with
+        :code:`feature_matrix.load_feature_matrix`. Previous training is
+        discarded, see :meth:`partial_train_from_matrix` to update a
+        trained classifier instead.
+
+        :param feature_matrix: 2-D matrix containing the feature vector
+            of each train instance as rows.
+        :type feature_matrix: numpy.ndarray
+        :param labels: Label of each row of the feature matrix.
+        :type labels: Union[List[str], numpy.ndarray]
+        :param feature_names: Names of the features, i.e. the columns of
+            the feature matrix.
+        :type feature_names: List[str]
+        :param block_size: Number of rows processed at once. Memory-mapped
+            matrices are only read block by block, such that matrices
+            larger than memory can be used. If None, all rows are
+            processed at once.
+        :type block_size: int
+        :return: ClassAverageClassifier
+        """
+        self.labels = []
+        self._average_feature_values = dict()
+        self._class_sums = dict()
+        self._class_counts = dict()
+        self.feature_names = FeatureSchema()
+
+        return self.partial_train_from_matrix(feature_matrix, labels,
+                                              feature_names, block_size)
+
+    def partial_train_from_matrix(self, feature_matrix, labels,
+                                  feature_names, block_size=None):
+        """
+        Updates the average feature vectors with a chunk of train
+        instances, e.g. a chunk yielded by a streaming source, without
+        discarding what has been learned from previous chunks. Training
+        on several chunks gives the same model as training on all of
+        them at once.
+
+        :param feature_matrix: 2-D matrix containing the feature vector
+            of each train instance of the chunk as rows.
+        :type feature_matrix: numpy.ndarray
+        :param labels: Label of each row of the feature matrix.
+        :type labels: Union[List[str], numpy.ndarray]
+        :param feature_names: Names of the features, i.e. the columns of
+            the feature matrix.
+        :type feature_names: List[str]
+        :param block_size: Number of rows processed at once. If None,
+            all rows are processed at once.
+        :type block_size: int
+        :return: ClassAverageClassifier
+        """
+        if block_size is not None and block_size < 1:
+            raise ValueError(f"block_size should be a positive integer. "
+                             f"block_size is: {block_size}")
+        if len(labels) != len(feature_matrix):
+            raise ValueError(f"Number of labels ({len(labels)}) and number "
+                             f"of rows in feature matrix "
+                             f"({len(feature_matrix)}) don't match up.")
+        self._check_statistics()
+        if not self.labels:
+            self.feature_names = FeatureSchema.from_names(feature_names)
+        elif not self._matches_schema(feature_names):
+            raise ValueError("Feature names of train instances and "
+                             "classifier don't match up. Make sure to use "
+                             "the same Featurizer!")
+
+        # update sum and number of feature vectors of each class
+        block_size = block_size or max(1, len(feature_matrix))
+        for start in range(0, len(feature_matrix), block_size):
+            for label, class_sum, count in self._get_class_statistics(
+                    feature_matrix[start:start+block_size],
+                    labels[start:start+block_size]):
+                self._add_statistics(label, class_sum, count)
+
+        return self
+
+    def partial_train_from_dicts(self, dicts):
+        """
+        Updates the average feature vectors with a chunk of featurized
+        train instances, e.g. a chunk yielded by
+        :code:`CSVPreprocessor.iter_chunks` and featurized using
+        :code:`TweetFeaturizer.extract_features_from_dicts`.
+
+        :param dicts: List of dicts or SampleStore, where each dict
+            represents an instance and contains the keys
+            "feature_vector", "feature_names" and "label".
+        :type dicts: Union[List[dict], SampleStore]
+        :return: ClassAverageClassifier
+        """
+        if not dicts:
+            return self
+
+        feature_matrix, feature_names = self._get_feature_matrix(dicts)
+        if isinstance(dicts, SampleStore):
+            labels = dicts.column("label")
+        else:
+            labels = [instance["label"] for instance in dicts]
+
+        return self.partial_train_from_matrix(feature_matrix, labels,
+                                              feature_names)
+
+    @classmethod
+    def train_from_shards(cls, filenames, featurizer, exclude=set(),
+                          n_workers=None, chunk_size=10000, delimiter="\t",
+                          text_column="text", label_column="label"):
+        """
+        Trains a classifier on train data split into multiple csv-files
+        (=shards) using a pool of worker processes. Each worker streams
+        a shard in chunks, featurizes the chunks and computes the sum
+        and number of feature vectors of each class per chunk. The
+        per-chunk statistics are added up in the order of the shards,
+        such that the resulting classifier is identical to training on
+        the same chunks one after another in a single process (see
+        :meth:`partial_train_from_dicts`).
+
+        :param filenames: Shard files or glob patterns, see
+            :code:`CSVPreprocessor.iter_chunks`.
+        :type filenames: Union[str, List[str]]
+        :param featurizer: Featurizer used to extract the features in
+            the worker processes. It is serialized once per worker and
+            runs spaCy in the worker process itself. The workers don't
+            use the featurizer's annotation cache.
+        :type featurizer: TweetFeaturizer
+        :param exclude: Set of features that should be excluded from
+            the feature vectors.
+        :type exclude: Set[str]
+        :param n_workers: Number of worker processes. If None, the
+            number of CPUs available to this process is used.
+        :type n_workers: int
+        :param chunk_size: Number of instances featurized at once per
+            worker.
+        :type chunk_size: int
+        :param delimiter: Delimiter that is used in the csv-files.
+        :type delimiter: str
+        :param text_column: Column in csv-files containing text.
+        :type text_column: str
+        :param label_column: Column in csv-files containing label.
+        :type label_column: str
+        :return: ClassAverageClassifier
+        """
+        # serialization of the featurizer is only needed for training
+        import dill
+
+        filenames = CSVPreprocessor.expand_filenames(filenames)
+        if n_workers is None:
+            n_workers = available_cpus()
+        n_workers = max(1, min(n_workers, len(filenames)))
+        logger.info(f"Training the classifier on {len(filenames)} shards "
+                    f"using {n_workers} worker processes...")
+
+        classifier = cls()
+        shard_args = [(filename, exclude, chunk_size, delimiter, text_column,
+                       label_column) for filename in filenames]
+        with ProcessPoolExecutor(max_workers=n_workers,
+                                 initializer=_init_training_worker,
+                                 initargs=(dill.dumps(featurizer),)) \
+                as executor:
+            # executor.map returns results in order of the shards, which
+            # keeps the order of the classes deterministic
+            for filename, chunk_statistics in zip(
+                    filenames, executor.map(_train_shard, shard_args)):
+                for feature_names, class_statistics in chunk_statistics:
+                    if classifier.labels and \
+                            not classifier._matches_schema(feature_names):
+                        raise ValueError(f"Features of {filename} don't "
+                                         f"match the features of the "
+                                         f"previous shards.")
+                    classifier.feature_names = feature_names
+                    for label, class_sum, count in class_statistics:
+                        classifier._add_statistics(label, class_sum, count)
+                logger.info(f"Trained on {filename}.")
+
+        logger.info("Training done.")
+
+        return classifier
+
+    def merge(self, other):
+        """
+        Adds the train instances another classifier has been trained on
+        to this classifier, such that it gives the same model as
+        training on the train instances of both classifiers, e.g. to
+        combine classifiers trained on different shards of the data.
+
+        :param other: Classifier to merge into this one.
+        :type other: ClassAverageClassifier
+        :return: ClassAverageClassifier
+        """
+        self._check_statistics()
+        other._check_statistics()
+        if not other.labels:
+            return self
+        if self.labels and not self._matches_schema(other.feature_names):
+            raise ValueError("Feature names of classifiers to merge don't "
+                             "match up.")
+        self.feature_names = FeatureSchema.from_names(other.feature_names)
+
+        for label in other.labels:
+            self._add_statistics(label, other._class_sums[label],
+                                 other._class_counts[label])
 
         return self
 
-    def evaluate(self, preprocessor, evaluate_test=True, evaluate_dev=False):
+    def evaluate(self, preprocessor, evaluate_test=True, evaluate_dev=False,
+                 profiler=None):
         """
         Evaluates the current model on the preprocessor's test and/or
         dev set and prints a classification report containing accuracy,
@@ -82,10 +299,28 @@ class ClassAverageClassifier(BaseClassifier):
         :type evaluate_test: bool
         :param evaluate_dev: Whether to evaluate on dev set.
         :type evaluate_dev: bool
+        :param profiler: Profiler measuring the time spent evaluating
+            (stage "evaluate"), including making predictions (stage
+            "predict").
+        :type profiler: Profiler
         """
+        instances = 0
+        if evaluate_test:
+            instances += len(preprocessor.get_test_data())
+        if evaluate_dev:
+            instances += len(preprocessor.get_dev_data())
+
+        with get_profiler(profiler).stage("evaluate", instances):
+            self._evaluate(preprocessor, evaluate_test, evaluate_dev, profiler)
+
+    def _evaluate(self, preprocessor, evaluate_test, evaluate_dev, profiler):
+        # scikit-learn is only needed for evaluation
+        from sklearn.metrics import classification_report
+
         # make predictions
         self.predict(preprocessor, predict_train=False,
-                     predict_test=evaluate_test, predict_dev=evaluate_dev)
+                     predict_test=evaluate_test, predict_dev=evaluate_dev,
+                     profiler=profiler)
 
         # calculate evaluation scores
         if evaluate_test:
@@ -119,7 +354,7 @@ class ClassAverageClassifier(BaseClassifier):
                         f"{classification_report(gold_labels, predictions)}")
 
     def predict(self, preprocessor, predict_train=False, predict_test=True,
-                predict_dev=False):
+                predict_dev=False, profiler=None):
         """
         Makes predictions for samples inside preprocessor in-place, i.e.
         for each instance, a key 'prediction' containing the prediction
@@ -136,27 +371,30 @@ class ClassAverageClassifier(BaseClassifier):
         :type predict_test: bool
         :param predict_dev: Whether to make predictions on the dev set.
         :type predict_dev: bool
+        :param profiler: Profiler measuring the time spent making
+            predictions (stage "predict").
+        :type profiler: Profiler
         """
 
         if predict_train:
             train_set = preprocessor.get_train_data()
             logger.info(f"Making predictions on {len(train_set)} instances in "
                         f"train set.")
-            self.predict_from_dicts(train_set)
+            self.predict_from_dicts(train_set, profiler)
 
         if predict_test:
             test_set = preprocessor.get_test_data()
             logger.info(f"Making predictions on {len(test_set)} instances in "
                         f"test set.")
-            self.predict_from_dicts(test_set)
+            self.predict_from_dicts(test_set, profiler)
 
         if predict_dev:
             dev_set = preprocessor.get_dev_data()
             logger.info(f"Making predictions on {len(dev_set)} instances in "
                         f"dev set.")
-            self.predict_from_dicts(dev_set)
+            self.predict_from_dicts(dev_set, profiler)
 
-    def predict_from_dicts(self, dicts):
+    def predict_from_dicts(self, dicts, profiler=None):
         """
         Make predictions on a a list of dictionaries. Dictionaries must
         contain key 'feature_vector' consisting of the feature vector.
@@ -164,25 +402,110 @@ class ClassAverageClassifier(BaseClassifier):
         :param dicts: List of dicts, where each dict represents an
             instance,
         :type dicts: List[dict]
+        :param profiler: Profiler measuring the time spent making
+            predictions (stage "predict").
+        :type profiler: Profiler
         :return: Updated list of dictionaries.
         """
-        for instance in dicts:
-            if "feature_vector" in instance:
-                assert (len(instance["feature_vector"]) ==
-                        len(self.feature_names) and
-                        instance["feature_names"] == self.feature_names), (
-                    "Vectors of instances to predict and classifier "
-                    "doesn't match up. Make sure to use the same Featurizer!")
+        with get_profiler(profiler).stage("predict", len(dicts)):
+            if not dicts:
+                return dicts
+            assert all(self._matches_schema(feature_names)
+                       for feature_names in self._get_schemas(dicts)), (
+                "Vectors of instances to predict and classifier doesn't "
+                "match up. Make sure to use the same Featurizer!")
+
+            feature_matrix, _ = self._get_feature_matrix(dicts)
+            predictions = self.predict_from_matrix(feature_matrix)
+            if isinstance(dicts, SampleStore):
+                dicts.set_column("prediction", predictions)
+            else:
+                for instance, prediction in zip(dicts, predictions):
+                    instance["prediction"] = prediction
 
-                most_similar_label = self._get_most_similar_label(instance)
-                instance["prediction"] = most_similar_label
+        return dicts
 
+    def predict_from_matrix(self, feature_matrix, feature_names=None,
+                            block_size=None, out=None):
+        """
+        Makes predictions for the rows of a dense feature matrix, e.g.
+        as returned by :code:`TweetFeaturizer.extract_feature_matrices`
+        or a memory-mapped matrix loaded with
+        :code:`feature_matrix.load_feature_matrix`. The L1 distances
+        between the rows and the average feature vectors of all classes
+        are computed at once for blocks of rows.
+
+        :param feature_matrix: 2-D matrix containing the feature vector
+            of each instance to predict as rows.
+        :type feature_matrix: numpy.ndarray
+        :param feature_names: Names of the features, i.e. the columns of
+            the feature matrix. If given, they are checked against the
+            classifier's feature names.
+        :type feature_names: List[str]
+        :param block_size: Maximum number of rows processed at once. If
+            None, the block size is chosen such that the distances of a
+            block take up at most 32 MB.
+        :type block_size: int
+        :param out: Array the predicted labels are written to instead
+            of returning them as list, e.g. a :code:`numpy.memmap` to
+            predict on matrices larger than memory. If a filename is
+            given, the predictions are written to a memory-mapped
+            :code:`.npy`-file with this name.
+        :type out: Union[numpy.ndarray, str]
+        :return: List containing the predicted label of each row or, if
+            :code:`out` is given, the output array.
+        """
+        feature_matrix = np.asanyarray(feature_matrix)
+        if feature_matrix.ndim != 2 or \
+                feature_matrix.shape[1] != len(self.feature_names) or \
+                (feature_names is not None and
+                 not self._matches_schema(feature_names)):
+            raise ValueError("Vectors of instances to predict and classifier "
+                             "don't match up. Make sure to use the same "
+                             "Featurizer!")
+
+        # the order of the classes determines which class is predicted
+        # if distances are equal
+        labels = list(self._average_feature_values)
+        averages = np.array([self._average_feature_values[label]
+                             for label in labels], dtype=np.float64)
+
+        chunk_size = max(1, _PREDICTION_CHUNK_ELEMENTS //
+                         max(1, averages.size))
+        if block_size is not None:
+            if block_size < 1:
+                raise ValueError(f"block_size should be a positive integer. "
+                                 f"block_size is: {block_size}")
+            chunk_size = min(chunk_size, block_size)
+
+        if out is None:
+            predictions = np.empty(len(feature_matrix), dtype=np.intp)
+        else:
+            label_array = np.array(labels)
+            if isinstance(out, str):
+                out = np.lib.format.open_memmap(
+                    out, mode="w+", dtype=label_array.dtype,
+                    shape=(len(feature_matrix),))
+            elif len(out) != len(feature_matrix):
+                raise ValueError(f"Output array has to contain "
+                                 f"{len(feature_matrix)} rows. Number of "
+                                 f"rows is: {len(out)}")
+
+        for start in range(0, len(feature_matrix), chunk_size):
+            chunk = feature_matrix[start:start+chunk_size]
+            distances = np.abs(chunk[:, np.newaxis, :] -
+                               averages[np.newaxis, :, :]).sum(axis=2)
+            if out is None:
+                predictions[start:start+chunk_size] = distances.argmin(axis=1)
             else:
-                raise KeyError("Instance to predict doesn't contain feature "
-                               "vector. Make sure to apply first a "
-                               "Featurizer!")
+                out[start:start+chunk_size] = \
+                    label_array[distances.argmin(axis=1)]
 
-        return dicts
+        if out is None:
+            return [labels[idx] for idx in predictions]
+        if isinstance(out, np.memmap):
+            out.flush()
+        return out
 
     def save_average_feature_vectors(self, filename, delimiter="\t",
                                      label_col="label"):
@@ -199,7 +522,7 @@ class ClassAverageClassifier(BaseClassifier):
         logger.info(f"Saving average feature vectors to {filename}...")
         with open(filename, "w") as file:
             csv_writer = csv.writer(file, delimiter=delimiter)
-            csv_writer.writerow([label_col] + self.feature_names)
+            csv_writer.writerow([label_col] + list(self.feature_names))
             for label in self._average_feature_values:
                 csv_writer.writerow([label] +
                                     self._average_feature_values[label])
@@ -228,7 +551,7 @@ class ClassAverageClassifier(BaseClassifier):
             headers = next(csv_reader)
             label_col_idx = headers.index(label_col)
             headers.pop(label_col_idx)
-            classifier.feature_names = headers
+            classifier.feature_names = FeatureSchema(headers)
 
             for row in csv_reader:
                 label = row[label_col_idx]
@@ -240,21 +563,133 @@ class ClassAverageClassifier(BaseClassifier):
 
         return classifier
 
-    def _get_most_similar_label(self, instance):
-        # Computes similarity value of instance with average feature vector for
-        # each class. The smaller similarity value, the more similar are
-        # instance and average feature vector.
-
-        similarity_values = defaultdict(float)
-        instance_vector = instance["feature_vector"]
-
-        for label in self._average_feature_values:
-            average_vector = self._average_feature_values[label]
-            similarity = sum([abs(instance_val - average_val)
-                              for instance_val, average_val
-                              in zip(instance_vector, average_vector)])
-            similarity_values[label] = similarity
-
-        most_similar_label = min(similarity_values, key=similarity_values.get)
-
-        return most_similar_label
+    @staticmethod
+    def _get_schemas(instances):
+        # Returns the distinct feature name objects of the instances.
+        # Instances featurized together share one FeatureSchema, such
+        # that the feature names of a batch are usually compared once.
+        if isinstance(instances, SampleStore) and \
+                instances.is_featurized().all():
+            return [instances.feature_names]
+
+        schemas = {}
+        for instance in instances:
+            if "feature_vector" not in instance:
+                raise KeyError("Instance to predict doesn't contain feature "
+                               "vector. Make sure to apply first a "
+                               "Featurizer!")
+            feature_names = instance["feature_names"]
+            schemas.setdefault(id(feature_names), feature_names)
+        return list(schemas.values())
+
+    @staticmethod
+    def _get_class_statistics(feature_matrix, labels):
+        # Returns the sum and number of feature vectors of each class in
+        # order of the classes' first appearance.
+        if isinstance(labels, np.ndarray):
+            # group label arrays, e.g. memory-mapped ones, without
+            # iterating over the rows in Python
+            unique_labels, first_rows, inverse = np.unique(
+                labels, return_index=True, return_inverse=True)
+            class_statistics = []
+            for idx in np.argsort(first_rows):
+                rows = inverse == idx
+                class_statistics.append((
+                    unique_labels[idx].item(),
+                    feature_matrix[rows].sum(axis=0, dtype=np.float64),
+                    int(rows.sum())))
+            return class_statistics
+
+        rows_by_label = defaultdict(list)
+        for row, label in enumerate(labels):
+            rows_by_label[label].append(row)
+
+        return [(label,
+                 feature_matrix[rows].sum(axis=0, dtype=np.float64),
+                 len(rows))
+                for label, rows in rows_by_label.items()]
+
+    def _add_statistics(self, label, class_sum, count):
+        # Adds the sum and number of feature vectors of a class and
+        # updates its average feature vector.
+        if label not in self._class_counts:
+            self.labels.append(label)
+            self._class_sums[label] = np.zeros(len(class_sum))
+            self._class_counts[label] = 0
+        self._class_sums[label] += class_sum
+        self._class_counts[label] += count
+        self._average_feature_values[label] = \
+            (self._class_sums[label] / self._class_counts[label]).tolist()
+
+    def _check_statistics(self):
+        # Classifiers loaded from average feature vectors or saved by
+        # previous versions don't know the number of train instances per
+        # class, so they can't be updated.
+        if self.labels and set(self._class_counts) != set(self.labels):
+            raise ValueError("Classifier can't be updated as the number of "
+                             "train instances per class is unknown. Train "
+                             "the classifier again.")
+
+    def _matches_schema(self, feature_names):
+        # Compares feature names with the classifier's feature names.
+        # Lists of names are compared name by name, fingerprints are only
+        # compared if both are FeatureSchemas.
+        if not isinstance(feature_names, (FeatureSchema, list, tuple)):
+            feature_names = list(feature_names)
+        return self.feature_names == feature_names
+
+    def __setstate__(self, state):
+        # classifiers saved by previous versions store a list of
+        # feature names
+        state["feature_names"] = FeatureSchema.from_names(
+            state.get("feature_names", ()))
+        state.setdefault("_class_sums", dict())
+        state.setdefault("_class_counts", dict())
+        self.__dict__.update(state)
+
+    @staticmethod
+    def _get_feature_matrix(instances):
+        # Returns the feature matrix and feature names of featurized
+        # instances, using the matrix of a SampleStore without copying.
+        if isinstance(instances, SampleStore) and \
+                instances.is_featurized().all():
+            return instances.feature_matrix, instances.feature_names
+
+        feature_matrix = np.array([instance["feature_vector"]
+                                   for instance in instances], dtype=float)
+        return feature_matrix, instances[0]["feature_names"]
+
+
+# featurizer used by training worker processes
+_worker_featurizer = None
+
+
+def _init_training_worker(serialized_featurizer):
+    import dill
+
+    global _worker_featurizer
+    _worker_featurizer = dill.loads(serialized_featurizer)
+    # each worker is a single process, it mustn't start its own workers
+    _worker_featurizer.n_process = 1
+    # the workers would write to the cache's database concurrently
+    _worker_featurizer.annotation_cache = None
+
+
+def _train_shard(shard_args):
+    # Featurizes a shard chunk by chunk and returns the feature names
+    # and the statistics of each class for each chunk.
+    filename, exclude, chunk_size, delimiter, text_column, label_column = \
+        shard_args
+    chunk_statistics = []
+    for chunk in CSVPreprocessor.iter_chunks(filename, chunk_size, delimiter,
+                                             text_column, label_column):
+        feature_matrix, feature_schema = \
+            _worker_featurizer.extract_feature_matrix(chunk, exclude)
+        labels = [instance["label"] for instance in chunk]
+        chunk_statistics.append((
+            feature_schema,
+            ClassAverageClassifier._get_class_statistics(feature_matrix,
+                                                         labels)
+        ))
+
+    return chunk_statistics
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import logging
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+# maximum number of parameters per SQLite query
+_QUERY_BATCH_SIZE = 500
+
+
+class AnnotationCache:
+    """
+    Persistent cache for spaCy annotations backed by a local SQLite
+    file. Annotations are stored per text and are keyed by a hash of
+    the text together with the name, version and active pipeline
+    components of the spaCy model, such that annotations of different
+    models don't get mixed up. The number of cached texts is limited,
+    and when the limit is exceeded, the least recently used entries are
+    evicted.
+    """
+
+    def __init__(self, filename, max_entries=1000000):
+        """
+        Instantiates an AnnotationCache.
+
+        :param filename: SQLite file the annotations are stored in. It
+            is created if it doesn't exist.
+        :type filename: str
+        :param max_entries: Maximum number of texts to keep in the
+            cache.
+        :type max_entries: int
+        """
+        self.filename = filename
+        self.max_entries = max_entries
+        self._connection = None
+        self._clock = 0
+
+    def get_many(self, texts, model_key):
+        """
+        Looks up the annotations of multiple texts.
+
+        :param texts: Texts to look up.
+        :type texts: Iterable[str]
+        :param model_key: String identifying the spaCy model and its
+            active components, see :meth:`model_key`.
+        :type model_key: str
+        :return: Dictionary mapping each cached text to its annotations.
+        """
+        keys = {self._hash(text, model_key): text for text in texts}
+        annotations = {}
+        connection = self._connect()
+        key_list = list(keys)
+        for start in range(0, len(key_list), _QUERY_BATCH_SIZE):
+            batch = key_list[start:start+_QUERY_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = connection.execute(
+                f"SELECT key, value FROM annotations "
+                f"WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            for key, value in rows:
+                annotations[keys[key]] = json.loads(value)
+
+            # mark found entries as recently used
+            if rows:
+                connection.execute(
+                    f"UPDATE annotations SET last_used = ? "
+                    f"WHERE key IN ({','.join('?' * len(rows))})",
+                    [self._tick()] + [key for key, _ in rows]
+                )
+        connection.commit()
+
+        return annotations
+
+    def put_many(self, annotations, model_key):
+        """
+        Stores the annotations of multiple texts and evicts the least
+        recently used entries if the cache exceeds its size limit.
+
+        :param annotations: Dictionary mapping texts to annotations.
+        :type annotations: Dict[str, dict]
+        :param model_key: String identifying the spaCy model and its
+            active components, see :meth:`model_key`.
+        :type model_key: str
+        """
+        if not annotations:
+            return
+
+        connection = self._connect()
+        now = self._tick()
+        connection.executemany(
+            "INSERT OR REPLACE INTO annotations (key, value, last_used) "
+            "VALUES (?, ?, ?)",
+            [(self._hash(text, model_key), json.dumps(annotation), now)
+             for text, annotation in annotations.items()]
+        )
+
+        number_of_entries = connection.execute(
+            "SELECT COUNT(*) FROM annotations").fetchone()[0]
+        if number_of_entries > self.max_entries:
+            logger.debug(f"Evicting {number_of_entries - self.max_entries} "
+                         f"entries from annotation cache.")
+            connection.execute(
+                "DELETE FROM annotations WHERE key IN (SELECT key FROM "
+                "annotations ORDER BY last_used ASC LIMIT ?)",
+                (number_of_entries - self.max_entries,)
+            )
+        connection.commit()
+
+    def __len__(self):
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM annotations").fetchone()[0]
+
+    def clear(self):
+        """
+        Removes all entries from the cache.
+        """
+        connection = self._connect()
+        connection.execute("DELETE FROM annotations")
+        connection.commit()
+
+    @staticmethod
+    def model_key(spacy_model, fields=None):
+        """
+        Returns a string identifying a spaCy model, its version, its
+        active pipeline components and the annotation fields extracted
+        from its Docs.
+
+        :param spacy_model: spaCy language model.
+        :type spacy_model: spacy.language.Language
+        :param fields: Names of the cached annotation fields.
+        :type fields: Iterable[str]
+        :return: str
+        """
+        meta = spacy_model.meta
+        model_key = (f"{meta.get('lang')}_{meta.get('name')}-"
+                     f"{meta.get('version')}:"
+                     f"{','.join(spacy_model.pipe_names)}")
+        if fields is not None:
+            model_key += f":{','.join(sorted(fields))}"
+        return model_key
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.filename)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS annotations ("
+                "key TEXT PRIMARY KEY, value TEXT, last_used INTEGER)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS annotations_last_used "
+                "ON annotations (last_used)"
+            )
+            self._clock = self._connection.execute(
+                "SELECT COALESCE(MAX(last_used), 0) FROM annotations"
+            ).fetchone()[0]
+        return self._connection
+
+    def _tick(self):
+        # logical clock that orders cache accesses for LRU eviction
+        self._clock += 1
+        return self._clock
+
+    @staticmethod
+    def _hash(text, model_key):
+        return hashlib.sha1(f"{model_key}\n{text}".encode("utf-8")).hexdigest()
+
+    def __getstate__(self):
+        # SQLite connections can't be pickled, reconnect lazily instead
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        return state
@@ -1,7 +1,5 @@
 from abc import ABC, abstractmethod
 
-import dill
-
 
 class BaseFeaturizer(ABC):
     """
@@ -50,6 +48,8 @@ class BaseFeaturizer(ABC):
             saved.
         :type filename: str
         """
+        import dill
+
         with open(filename, "wb") as file:
             dill.dump(self, file)
 
@@ -64,6 +64,8 @@ class BaseFeaturizer(ABC):
 
         :return: Classifier instance.
         """
+        import dill
+
         with open(filename, "rb") as file:
             featurizer = dill.load(file)
 
@@ -0,0 +1,110 @@
+from collections.abc import Sequence
+import hashlib
+import json
+
+
+class FeatureSchema(Sequence):
+    """
+    Immutable, ordered list of feature names describing the columns of
+    a feature matrix. One FeatureSchema is shared by all feature vectors
+    extracted in one run instead of each instance holding its own list
+    of feature names.
+
+    A FeatureSchema behaves like a read-only list of strings and
+    compares equal to lists and tuples containing the same names, such
+    that code that expects a list of feature names keeps working.
+    Comparing two FeatureSchemas only compares their fingerprints, which
+    are computed once per schema.
+    ::
+        schema = FeatureSchema(["alpha", "upper"])
+        schema.index("upper")  # 1
+        schema == ["alpha", "upper"]  # True
+    """
+
+    __slots__ = ("_names", "_positions", "_fingerprint")
+
+    def __init__(self, feature_names=()):
+        """
+        Instantiates a FeatureSchema.
+
+        :param feature_names: Names of the features in column order.
+        :type feature_names: Iterable[str]
+        """
+        self._names = tuple(feature_names)
+        self._positions = None
+        self._fingerprint = None
+
+    @classmethod
+    def from_names(cls, feature_names):
+        """
+        Returns the feature names as FeatureSchema, without copying them
+        if they already are a FeatureSchema.
+
+        :param feature_names: Names of the features in column order.
+        :type feature_names: Union[FeatureSchema, Iterable[str]]
+        :return: FeatureSchema
+        """
+        if isinstance(feature_names, cls):
+            return feature_names
+        return cls(feature_names)
+
+    @property
+    def fingerprint(self):
+        """
+        SHA-1 hex digest identifying the feature names and their order.
+        """
+        if self._fingerprint is None:
+            self._fingerprint = hashlib.sha1(
+                json.dumps(self._names).encode("utf-8")).hexdigest()
+        return self._fingerprint
+
+    def index(self, feature_name, *args):
+        """
+        Returns the column of a feature.
+
+        :param feature_name: Name of the feature.
+        :type feature_name: str
+        :return: int
+        """
+        if args:
+            return self._names.index(feature_name, *args)
+        if self._positions is None:
+            self._positions = {}
+            for position, name in enumerate(self._names):
+                self._positions.setdefault(name, position)
+        try:
+            return self._positions[feature_name]
+        except KeyError:
+            raise ValueError(f"'{feature_name}' is not in FeatureSchema.") \
+                from None
+
+    def __contains__(self, feature_name):
+        return feature_name in self._names
+
+    def __len__(self):
+        return len(self._names)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return FeatureSchema(self._names[idx])
+        return self._names[idx]
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __eq__(self, other):
+        if isinstance(other, FeatureSchema):
+            return self is other or (len(self) == len(other) and
+                                     self.fingerprint == other.fingerprint)
+        if isinstance(other, (list, tuple)):
+            return self._names == tuple(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.fingerprint)
+
+    def __repr__(self):
+        return f"FeatureSchema({list(self._names)!r})"
+
+    def __reduce__(self):
+        return FeatureSchema, (self._names,)
@@ -1,16 +1,32 @@
-from multiprocessing import cpu_count
-from collections import Counter
-from statistics import mean
+from collections import ChainMap, Counter
+from contextlib import closing
+import functools
+import multiprocessing
+import hashlib
 import logging
 import itertools
+import json
+import os
+import weakref
 
-import spacy
-from spacymoji import Emoji
+import numpy as np
 
+from text_classification.featurizer.annotation_cache import AnnotationCache
 from text_classification.featurizer.base import BaseFeaturizer
+from text_classification.featurizer.emojis import count_emojis, is_emoji
+from text_classification.featurizer.schema import FeatureSchema
+from text_classification.preprocessor.sample_store import SampleStore
+from text_classification.profiling import get_profiler
+from text_classification.utils import available_cpus
 
 logger = logging.getLogger(__name__)
 
+EMOJI_BACKENDS = ("builtin", "spacymoji")
+
+# names of the feature functions defined by TweetFeaturizer
+_BUILTIN_FEATURE_FUNCTIONS = ("_char_based_features", "_word_based_features",
+                              "_pos_features", "_ner_features")
+
 
 class TweetFeaturizer(BaseFeaturizer):
     """
@@ -19,7 +35,26 @@ class TweetFeaturizer(BaseFeaturizer):
     tweets.
     """
 
-    def __init__(self, lang_model="en_core_web_sm", normalize=True):
+    # token-level annotations, holding one value per token or entity
+    ANNOTATION_FIELDS = ("tokens", "lemmas", "pos_tags", "named_entities",
+                         "is_stop", "is_emoji")
+    # count-level annotations the predefined features are computed from
+    ANNOTATION_COUNTS = ("token_count", "token_length_sum", "stop_word_count",
+                         "emoji_count", "pos_tag_counts",
+                         "named_entity_counts")
+    CHAR_FEATURES = ("alpha", "upper", "lower", "numeric", "whitespace",
+                     "comma", "dot", "exclamation", "question", "colon",
+                     "semicolon", "hyphen", "at", "hashtag")
+    # spaCy pipeline components and the annotation fields they provide
+    PIPE_ANNOTATIONS = {"tagger": ("lemmas", "pos_tags", "pos_tag_counts"),
+                        "ner": ("named_entities", "named_entity_counts"),
+                        "emoji": ("is_emoji", "emoji_count")}
+
+    def __init__(self, lang_model="en_core_web_sm", normalize=True,
+                 deduplicate=True, cache_filename=None,
+                 cache_max_entries=1000000, n_process=None, batch_size=1000,
+                 keep_annotations=False, emoji_backend="builtin",
+                 tokenizer_only=False):
         """
         Instantiates a TweetFeaturizer instance.
 
@@ -28,32 +63,103 @@ class TweetFeaturizer(BaseFeaturizer):
         :param normalize: Whether to normalize the features based on
             number of chars/tokens.
         :type normalize: bool
+        :param deduplicate: Whether to annotate and featurize each
+            distinct text only once and share the result between all
+            instances with the same text. This assumes that custom
+            feature functions only depend on the instance's text.
+        :type deduplicate: bool
+        :param cache_filename: SQLite file to cache spaCy annotations
+            in, such that texts that have been annotated in previous
+            runs don't have to be processed by spaCy again. If None,
+            annotations are not cached.
+        :type cache_filename: str
+        :param cache_max_entries: Maximum number of texts to keep in the
+            annotation cache. Least recently used texts are evicted
+            first.
+        :type cache_max_entries: int
+        :param n_process: Number of worker processes used to run spaCy.
+            If None, the number of CPUs available to this process is
+            used, respecting CPU affinity and container CPU quotas. The
+            worker pool is kept alive between calls and is shut down
+            by :meth:`close`, when leaving a :code:`with` block using
+            the featurizer, or when the featurizer is garbage collected.
+        :type n_process: int
+        :param batch_size: Number of texts spaCy processes per batch.
+            Worker processes are only used if there are more texts to
+            annotate than fit into one batch.
+        :type batch_size: int
+        :param keep_annotations: Whether to add the token-level spaCy
+            annotations (see :attr:`ANNOTATION_FIELDS`) to the instances.
+            If False, features are computed from each text's annotations
+            as soon as spaCy has processed the text, and the annotations
+            are discarded afterwards.
+        :type keep_annotations: bool
+        :param emoji_backend: How to detect emojis. "builtin" matches
+            emojis against a precompiled table of emoji code points.
+            "spacymoji" adds spacymoji's component to the spaCy
+            pipeline, which additionally merges emojis consisting of
+            multiple code points into single tokens, but is slower.
+        :type emoji_backend: str
+        :param tokenizer_only: Whether to only run spaCy's tokenizer
+            instead of the whole pipeline. The statistical components
+            (tagger and NER) are not loaded, and only the char-based and
+            word-based features are extracted (see
+            :meth:`feature_schema`), which is considerably faster.
+            Requires the "builtin" emoji backend.
+        :type tokenizer_only: bool
         """
+        if emoji_backend not in EMOJI_BACKENDS:
+            raise ValueError(f"Unknown emoji backend '{emoji_backend}'. "
+                             f"Possible values: {EMOJI_BACKENDS}")
+        if tokenizer_only and emoji_backend != "builtin":
+            raise ValueError(f"Emoji backend '{emoji_backend}' is a spaCy "
+                             f"pipeline component and can't be used in "
+                             f"tokenizer-only mode.")
 
-        try:
-            # initialize spacy model
-            self.spacy_model = spacy.load(lang_model, disable=["parser"])
-            emoji_detector = Emoji(self.spacy_model)
-            self.spacy_model.add_pipe(emoji_detector, first=True)
-        except OSError:
-            # user inserted an unknown model name
-            raise ModuleNotFoundError(
-                f"Language model '{lang_model}' not installed.\n"
-                f"\tTo install the model, execute: 'python -m spacy download "
-                f"{lang_model}'\n"
-                f"\tAvailable models can be found at: "
-                f"https://spacy.io/usage/models"
-            )
+        self.lang_model = lang_model
+        self.emoji_backend = emoji_backend
+        self.tokenizer_only = tokenizer_only
+        self._spacy_model = _load_spacy_model(lang_model, emoji_backend,
+                                              tokenizer_only)
+        self.model_version = self._spacy_model.meta.get("version")
+        self._model_bundle = None
 
         self.normalize = normalize
+        self.deduplicate = deduplicate
+        self.n_process = n_process
+        self.batch_size = batch_size
+        self.keep_annotations = keep_annotations
+        self._pool = None
+        self._pool_finalizer = None
+        self._char_tables = {}
+        self.annotation_cache = None
+        if cache_filename is not None:
+            self.annotation_cache = AnnotationCache(cache_filename,
+                                                    cache_max_entries)
         self.feature_functions = [
             self._char_based_features,
             self._word_based_features,
-            self._pos_features,
-            self._ner_features,
         ]
+        if not tokenizer_only:
+            self.feature_functions += [
+                self._pos_features,
+                self._ner_features,
+            ]
+        self.batch_feature_functions = []
+        self._required_annotations = {}
+
+    @property
+    def spacy_model(self):
+        """
+        spaCy language model used to annotate texts. Featurizers loaded
+        from a file load the model on first use.
+        """
+        if self._spacy_model is None:
+            self._spacy_model = self._load_model()
+        return self._spacy_model
 
-    def add_feature(self, feature_extraction_function):
+    def add_feature(self, feature_extraction_function,
+                    required_annotations=None):
         """
         Adds a custom feature extraction function to the predefined
         ones. The feature extraction function must take as input a
@@ -63,10 +169,112 @@ class TweetFeaturizer(BaseFeaturizer):
         :param feature_extraction_function: Custom function that
             extracts features from text.
         :type feature_extraction_function: function
+        :param required_annotations: Annotation fields the function
+            reads, e.g. :code:`{"tokens", "pos_tags"}`. Token-level
+            fields (see :attr:`ANNOTATION_FIELDS`) and count-level fields
+            (see :attr:`ANNOTATION_COUNTS`) can be requested. spaCy
+            components that aren't needed by any feature function are
+            disabled during feature extraction. If None, the function is
+            assumed to need all token-level annotations that are
+            available.
+        :type required_annotations: Set[str]
         """
+        required_annotations = self._check_required_annotations(
+            required_annotations)
         self.feature_functions.append(feature_extraction_function)
+        self._required_annotations[feature_extraction_function] = \
+            required_annotations
+
+    def add_batch_feature(self, batch_function, feature_names,
+                          required_annotations=None, parallel=False,
+                          columnar=False):
+        """
+        Adds a custom feature extraction function that featurizes a
+        batch of instances per call, e.g. a vectorized NumPy
+        implementation. The function must take as input a list of
+        dictionaries, each containing the key 'text' and the requested
+        annotations, and return a 2-D array with one row per instance
+        and one column per feature name. Batch features are appended to
+        the features of the other feature functions.
+
+        :param batch_function: Custom function that extracts features
+            from a batch of instances.
+        :type batch_function: function
+        :param feature_names: Names of the features, i.e. the columns of
+            the arrays returned by :code:`batch_function`. Features
+            whose name is excluded are dropped from the feature vectors.
+        :type feature_names: List[str]
+        :param required_annotations: Annotation fields the function
+            reads (see :meth:`add_feature`). If None, the function is
+            assumed to need all token-level annotations.
+        :type required_annotations: Set[str]
+        :param parallel: Whether to split each batch between the worker
+            processes of the featurizer (see :code:`n_process`). Useful
+            for pure-Python functions. The function has to be picklable,
+            i.e. defined at module level.
+        :type parallel: bool
+        :param columnar: Whether to pass the batch as a dictionary
+            mapping each field to the list of its values for all
+            instances of the batch instead of as a list of dictionaries.
+        :type columnar: bool
+        """
+        if len(set(feature_names)) != len(feature_names):
+            raise ValueError(f"Feature names of batch feature function must "
+                             f"be unique. Feature names are: {feature_names}")
+
+        required_annotations = self._check_required_annotations(
+            required_annotations)
+        self.batch_feature_functions.append(
+            (batch_function, tuple(feature_names), parallel, columnar))
+        self._required_annotations[batch_function] = required_annotations
 
-    def extract_features(self, preprocessor, exclude=set()):
+    def feature_schema(self, exclude=set()):
+        """
+        Returns the :class:`FeatureSchema` of the feature vectors
+        extracted with the current configuration of the featurizer,
+        i.e. the names of the features in the order they appear in the
+        feature vectors.
+
+        The schema is derived from the configuration without extracting
+        any features. It can't be derived if custom feature functions
+        have been added with :meth:`add_feature`, as their feature names
+        are only known after extracting features.
+
+        :param exclude: Set of features that are excluded from the
+            feature vectors.
+        :type exclude: Set[str]
+        :return: FeatureSchema
+        """
+        feature_names = []
+        for function in self.feature_functions:
+            if function == self._char_based_features:
+                feature_names += self.CHAR_FEATURES
+            elif function == self._word_based_features:
+                feature_names += [name for name in ("stop_words", "emojis",
+                                                    "token_counts",
+                                                    "avg_token_len")
+                                  if name not in exclude]
+            elif function == self._pos_features:
+                if "pos" not in exclude:
+                    feature_names += BaseFeaturizer.COARSE_POS_TAGS
+            elif function == self._ner_features:
+                if "ner" not in exclude:
+                    feature_names += self.spacy_model.pipe_labels["ner"]
+            else:
+                name = getattr(function, "__name__", repr(function))
+                raise ValueError(f"Feature names of custom feature function "
+                                 f"{name} are only known after extracting "
+                                 f"features. Use the feature names of "
+                                 f"featurized instances instead.")
+        for _, batch_feature_names, columns, _, _ \
+                in self._get_batch_features(exclude):
+            feature_names += [batch_feature_names[column]
+                              for column in columns]
+
+        return FeatureSchema(feature_names)
+
+    def extract_features(self, preprocessor, exclude=set(),
+                         incremental=False, profiler=None):
         """
         Extracts the features for all splits in the preprocessor and
         adds feature vector and feature name for each instance in-place.
@@ -76,76 +284,564 @@ class TweetFeaturizer(BaseFeaturizer):
         :param exclude: Set of features that should be excluded from
             resulting feature vectors.
         :param exclude: Set[str]
+        :param incremental: Whether to only featurize instances that
+            don't have a feature vector extracted with the current
+            configuration of the featurizer yet (see :meth:`fingerprint`),
+            e.g. instances that have been added to the preprocessor since
+            features were last extracted.
+        :type incremental: bool
+        :param profiler: Profiler measuring the time spent running spaCy
+            (stage "spacy") and in each feature function (stages
+            "feature_function:<name>").
+        :type profiler: Profiler
+        """
+        self.extract_feature_matrices(preprocessor, exclude,
+                                      incremental=incremental,
+                                      profiler=profiler)
+
+    def extract_feature_matrices(self, preprocessor, exclude=set(),
+                                 dtype=np.float64, set_instance_features=True,
+                                 incremental=False, profiler=None):
+        """
+        Extracts the features for all splits in the preprocessor and
+        returns them as one dense feature matrix per split together with
+        the :class:`FeatureSchema` describing the matrices' columns.
+
+        :param preprocessor: Preprocessor containing samples to featurize.
+        :type preprocessor: BasePreprocessor
+        :param exclude: Set of features that should be excluded from
+            resulting feature vectors.
+        :param exclude: Set[str]
+        :param dtype: Floating point type of the feature matrices, e.g.
+            :code:`numpy.float32` to halve their memory footprint.
+        :type dtype: numpy.dtype
+        :param set_instance_features: Whether to also add feature vector
+            and feature names to the preprocessor's instances.
+        :type set_instance_features: bool
+        :param incremental: Whether to only featurize instances that
+            don't have a feature vector extracted with the current
+            configuration of the featurizer yet. The feature vectors of
+            all other instances are reused.
+        :type incremental: bool
+        :param profiler: Profiler measuring the time spent running spaCy
+            (stage "spacy") and in each feature function (stages
+            "feature_function:<name>").
+        :type profiler: Profiler
+        :return: Tuple with list of feature matrices in the order of the
+            preprocessor's splits (see :code:`get_data`) and the
+            FeatureSchema shared by all of them.
         """
         logger.info("Extracting features...")
 
-        data_splits = preprocessor.get_data()
+        feature_matrices, feature_schema = self._featurize_splits(
+            preprocessor.get_data(), exclude, dtype, set_instance_features,
+            incremental, profiler)
+
+        return feature_matrices, feature_schema
+
+    def extract_feature_matrix(self, dicts, exclude=set(), dtype=np.float64,
+                               profiler=None):
+        """
+        Extracts the features for a list of dictionaries and returns
+        them as a dense feature matrix without adding feature vector and
+        feature names to the dictionaries.
+
+        :param dicts: List of dicts or SampleStore, where each dict
+            represents an instance and contains the key 'text'.
+        :type dicts: Union[List[dict], SampleStore]
+        :param exclude: Set of features that should be excluded from
+            resulting feature vectors.
+        :param exclude: Set[str]
+        :param dtype: Floating point type of the feature matrix.
+        :type dtype: numpy.dtype
+        :param profiler: Profiler measuring the time spent running spaCy
+            (stage "spacy") and in each feature function (stages
+            "feature_function:<name>").
+        :type profiler: Profiler
+        :return: Tuple with feature matrix containing one row per
+            instance and the FeatureSchema describing its columns.
+        """
+        return self._featurize(dicts, exclude, dtype, profiler)
+
+    def extract_features_from_dicts(self, dicts, exclude=set(),
+                                    incremental=False, profiler=None):
+        """
+        Extracts the features for a list of dictionaries and adds
+        feature vector and feature names to each dictionary in-place.
+        This allows to featurize data chunk by chunk, e.g. chunks
+        yielded by :code:`CSVPreprocessor.iter_chunks`.
+
+        :param dicts: List of dicts or SampleStore, where each dict
+            represents an instance and contains the key 'text'.
+        :type dicts: Union[List[dict], SampleStore]
+        :param exclude: Set of features that should be excluded from
+            resulting feature vectors.
+        :param exclude: Set[str]
+        :param incremental: Whether to only featurize dictionaries that
+            don't have a feature vector extracted with the current
+            configuration of the featurizer yet.
+        :type incremental: bool
+        :param profiler: Profiler measuring the time spent running spaCy
+            (stage "spacy") and in each feature function (stages
+            "feature_function:<name>").
+        :type profiler: Profiler
+        :return: Updated list of dictionaries.
+        """
+        self._featurize_splits([dicts], exclude, incremental=incremental,
+                               profiler=profiler)
+
+        return dicts
+
+    def fingerprint(self, exclude=set()):
+        """
+        Returns a string identifying the configuration features are
+        extracted with, i.e. the spaCy model, the feature functions,
+        normalization and excluded features. Instances featurized in
+        incremental mode store the fingerprint in their field
+        :code:`feature_fingerprint`, such that features of instances
+        that have already been featurized with the same configuration
+        are not extracted again.
+
+        :param exclude: Set of features that are excluded from the
+            feature vectors.
+        :type exclude: Set[str]
+        :return: str
+        """
+        meta = self.spacy_model.meta
+        configuration = {
+            "lang_model": self.lang_model,
+            "model_version": meta.get("version"),
+            "pipe_names": list(self.spacy_model.pipe_names),
+            "normalize": self.normalize,
+            "exclude": sorted(exclude),
+            "feature_functions": [
+                _function_identity(function)
+                for function in self.feature_functions
+            ],
+            "batch_feature_functions": [
+                [_function_identity(function), list(feature_names)]
+                for function, feature_names, _, _
+                in self.batch_feature_functions
+            ],
+        }
+        return hashlib.sha1(json.dumps(configuration, sort_keys=True)
+                            .encode("utf-8")).hexdigest()
+
+    def close(self):
+        """
+        Shuts down the worker processes used to run spaCy, if any. The
+        worker pool is kept alive between calls to
+        :meth:`extract_features` and started again when needed.
+        Using the featurizer in a :code:`with` block calls this method
+        when leaving the block.
+        """
+        if self._pool is not None:
+            self._pool_finalizer()
+            self._pool = None
+            self._pool_finalizer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def save(self, filename, bundle_model=False):
+        """
+        Saves the featurizer's configuration and feature functions in
+        binary format. The spaCy model itself is not saved, only its
+        name and version, and it is loaded on first use after loading
+        the featurizer.
+
+        :param filename: Name of the file where the featurizer should be
+            saved.
+        :type filename: str
+        :param bundle_model: Whether to additionally write the spaCy
+            model to the directory :code:`<filename>.spacy` using
+            :code:`to_disk`, such that the loaded featurizer reads the
+            model from there instead of requiring the model package to
+            be installed.
+        :type bundle_model: bool
+        """
+        if bundle_model:
+            model_bundle = f"{filename}.spacy"
+            logger.info(f"Writing spaCy model to {model_bundle}...")
+            # the emoji component can't be serialized and is added again
+            # when loading the model
+            with self.spacy_model.disable_pipes(
+                    *[pipe for pipe in self.spacy_model.pipe_names
+                      if pipe == "emoji"]):
+                self.spacy_model.to_disk(model_bundle)
+            self._model_bundle = os.path.abspath(model_bundle)
+
+        super().save(filename)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Loads a previously saved featurizer from a binary file. The
+        spaCy model is loaded on first use, from the model bundle next
+        to the file if the featurizer was saved with a bundled model.
+
+        :param filename: Name of the binary file that the featurizer
+            should be loaded from.
+        :type filename: str
+        :return: TweetFeaturizer instance.
+        """
+        featurizer = super().load(filename)
+
+        # look for the model bundle next to the file, as the file might
+        # have been moved together with the bundle
+        if featurizer._model_bundle is not None:
+            model_bundle = os.path.join(
+                os.path.dirname(os.path.abspath(filename)),
+                os.path.basename(featurizer._model_bundle))
+            if os.path.isdir(model_bundle):
+                featurizer._model_bundle = model_bundle
+
+        return featurizer
+
+    def __getstate__(self):
+        # worker processes can't be pickled, and spaCy model and char
+        # tables are loaded again lazily
+        state = self.__dict__.copy()
+        state["_pool"] = None
+        state["_pool_finalizer"] = None
+        state["_spacy_model"] = None
+        state["_char_tables"] = {}
+        return state
+
+    def __setstate__(self, state):
+        # featurizers saved by previous versions contain the spaCy model
+        # and only some of the attributes, the others get their defaults
+        state.setdefault("_spacy_model", state.pop("spacy_model", None))
+        meta = {}
+        if state["_spacy_model"] is not None:
+            meta = state["_spacy_model"].meta
+        if "lang_model" not in state:
+            state["lang_model"] = f"{meta.get('lang', 'en')}_" \
+                                  f"{meta.get('name', 'core_web_sm')}"
+            state.setdefault("model_version", meta.get("version"))
+        state.setdefault("model_version", None)
+        state.setdefault("_model_bundle", None)
+        state.setdefault("emoji_backend", "spacymoji")
+        state.setdefault("tokenizer_only", False)
+        state.setdefault("normalize", True)
+        state.setdefault("deduplicate", True)
+        state.setdefault("n_process", None)
+        state.setdefault("batch_size", 1000)
+        state.setdefault("keep_annotations", False)
+        state.setdefault("annotation_cache", None)
+        state.setdefault("batch_feature_functions", [])
+        state.setdefault("_required_annotations", {})
+        state.setdefault("_char_tables", {})
+        state.setdefault("_pool", None)
+        state.setdefault("_pool_finalizer", None)
+        # some dill versions restore methods as copies of the saved
+        # functions, which aren't recognized as the built-in feature
+        # functions, so these are replaced by the current methods
+        state["feature_functions"] = [
+            getattr(self, function.__name__)
+            if getattr(function, "__self__", None) is self and
+            function.__name__ in _BUILTIN_FEATURE_FUNCTIONS else function
+            for function in state["feature_functions"]
+        ]
+        self.__dict__.update(state)
+
+    def _load_model(self):
+        model = self._model_bundle or self.lang_model
+        logger.info(f"Loading spaCy model {model}...")
+        spacy_model = _load_spacy_model(model, self.emoji_backend,
+                                        self.tokenizer_only)
+
+        model_version = spacy_model.meta.get("version")
+        if self.model_version is not None and \
+                model_version != self.model_version:
+            logger.warning(f"Featurizer was saved with version "
+                           f"{self.model_version} of spaCy model "
+                           f"{self.lang_model}, but version {model_version} "
+                           f"is loaded. Extracted features might differ.")
+
+        return spacy_model
+
+    def _featurize_splits(self, data_splits, exclude=set(), dtype=np.float64,
+                          set_instance_features=True, incremental=False,
+                          profiler=None, fingerprint=None):
+        # The fingerprint of the configuration is only computed and
+        # stored with the feature vectors in incremental mode.
+        if incremental:
+            fingerprint = self.fingerprint(exclude)
+            split_rows = [self._get_outdated_rows(split, fingerprint)
+                          for split in data_splits]
+        else:
+            split_rows = [range(len(split)) for split in data_splits]
+
+        # featurize all splits in a single pass, such that spaCy is run
+        # only once over the data of all splits
+        instances = [split[row] for split, rows in zip(data_splits, split_rows)
+                     for row in rows]
+        feature_matrix, feature_schema = self._featurize(instances, exclude,
+                                                         dtype, profiler)
+
+        if incremental:
+            previous_schema = self._get_previous_schema(data_splits,
+                                                        split_rows)
+            if previous_schema is not None:
+                if instances and feature_schema != previous_schema:
+                    logger.warning("Features of new instances don't match "
+                                   "the previously extracted ones. Extracting "
+                                   "features for all instances again.")
+                    return self._featurize_splits(
+                        data_splits, exclude, dtype, set_instance_features,
+                        profiler=profiler, fingerprint=fingerprint)
+                feature_schema = previous_schema
+                feature_matrix = feature_matrix.reshape(
+                    len(instances), len(feature_schema))
+            logger.info(f"Reusing feature vectors of "
+                        f"{sum(map(len, data_splits)) - len(instances)} "
+                        f"instances.")
+
+        feature_matrices = []
+        split_start = 0
+        for split, rows in zip(data_splits, split_rows):
+            split_end = split_start + len(rows)
+            split_matrix = feature_matrix[split_start:split_end]
+            if incremental:
+                # combine previously and newly extracted feature vectors
+                new_rows = split_matrix
+                split_matrix = self._get_feature_matrix(
+                    split, len(feature_schema), dtype)
+                split_matrix[np.asarray(rows, dtype=np.intp)] = new_rows
+            feature_matrices.append(split_matrix)
+            if set_instance_features:
+                self._set_features(split, split_matrix, feature_schema,
+                                   fingerprint, rows)
+            split_start = split_end
+
+        logger.info(f"Extracted features for {len(instances)} instances.")
+
+        return feature_matrices, feature_schema
+
+    def _featurize(self, instances, exclude=set(), dtype=np.float64,
+                   profiler=None):
+        profiler = get_profiler(profiler)
+        # index instances by their text, such that each distinct text is
+        # annotated and featurized only once
+        if self.deduplicate:
+            text_positions = {}
+            unique_indices = []
+            inverse = []
+            for idx, instance in enumerate(instances):
+                text = instance["text"]
+                if text not in text_positions:
+                    text_positions[text] = len(unique_indices)
+                    unique_indices.append(idx)
+                inverse.append(text_positions[text])
+            unique_instances = [instances[idx] for idx in unique_indices]
+            logger.debug(f"Featurizing {len(unique_instances)} distinct texts "
+                         f"of {len(instances)} instances.")
+        else:
+            unique_indices = inverse = range(len(instances))
+            unique_instances = instances
+
+        # extract the features of each distinct instance from its spaCy
+        # annotations as soon as they are available, such that the
+        # annotations don't have to be kept for all instances
+        feature_matrix = np.empty((len(unique_instances), 0), dtype=dtype)
+        feature_schema = FeatureSchema()
+        batch_features = self._get_batch_features(exclude)
+        batch_feature_names = [feature_names[column] for _, feature_names,
+                               columns, _, _ in batch_features
+                               for column in columns]
+        # batch feature functions are applied to chunks of annotated
+        # instances, which are larger if they're split between workers
+        chunk_size = self.batch_size
+        if any(parallel for _, _, _, parallel, _ in batch_features) and \
+                self._get_n_process() > 1:
+            chunk_size *= self._get_n_process()
+            # the pool has to be started before spaCy components are
+            # disabled, see _iter_spacy_annotations
+            self._get_pool()
+        chunk = []
+        spacy_annotations = profiler.iterate(
+            "spacy", self._iter_spacy_annotations(unique_instances, exclude))
+        feature_functions = [
+            profiler.wrap(f"feature_function:"
+                          f"{getattr(function, '__name__', repr(function))}",
+                          function)
+            for function in self.feature_functions
+        ]
+        with closing(spacy_annotations):
+            for row, annotations in enumerate(spacy_annotations):
+                instance = unique_instances[row]
+                if self.keep_annotations:
+                    instance.update({field: annotations[field]
+                                     for field in self.ANNOTATION_FIELDS
+                                     if field in annotations})
+                # feature functions read annotations like instance fields
+                annotated_instance = ChainMap(annotations, instance)
+
+                count_dicts = [count_dict for count_dict
+                               in (function(annotated_instance, exclude)
+                                   for function in feature_functions)
+                               if count_dict is not None]
+                names = tuple(itertools.chain.from_iterable(count_dicts))
+                if row == 0:
+                    instance_feature_names = names
+                    feature_schema = FeatureSchema(itertools.chain(
+                        instance_feature_names, batch_feature_names))
+                    feature_matrix = np.empty(
+                        (len(unique_instances), len(feature_schema)),
+                        dtype=dtype)
+                    batch_column = len(instance_feature_names)
+                if names == instance_feature_names:
+                    feature_matrix[row, :batch_column] = [
+                        value for count_dict in count_dicts
+                        for value in count_dict.values()]
+                else:
+                    feature_matrix[row, :batch_column] = \
+                        self._align_features(count_dicts,
+                                             instance_feature_names,
+                                             instance)
+
+                if batch_features:
+                    chunk.append(annotated_instance)
+                    if len(chunk) == chunk_size or \
+                            row == len(unique_instances) - 1:
+                        self._apply_batch_features(
+                            batch_features, chunk,
+                            feature_matrix[row + 1 - len(chunk):row + 1,
+                                           batch_column:],
+                            profiler)
+                        chunk = []
+
+        # share annotations of distinct texts with their duplicates
+        if self.keep_annotations and len(unique_instances) < len(instances):
+            for idx, position in enumerate(inverse):
+                if unique_indices[position] != idx:
+                    annotated_instance = unique_instances[position]
+                    instances[idx].update({
+                        field: annotated_instance[field]
+                        for field in self.ANNOTATION_FIELDS
+                        if field in annotated_instance
+                    })
+
+        if len(instances) > len(unique_instances):
+            feature_matrix = feature_matrix[np.asarray(inverse)]
 
-        for split in data_splits:
-            # get annotations from spacy
-            self._add_spacy_annotations(split)
+        return feature_matrix, feature_schema
 
-            # extract features for each instance
-            for instance in split:
-                instance["feature_vector"] = []
-                instance["feature_names"] = []
-                for function in self.feature_functions:
-                    count_dict = function(instance, exclude)
-                    if count_dict is not None:
-                        instance["feature_vector"] += list(count_dict.values())
-                        instance["feature_names"] += list(count_dict.keys())
+    @staticmethod
+    def _align_features(count_dicts, feature_names, instance):
+        # Returns the feature values of an instance in the order of the
+        # given feature names, which are the ones of the first instance.
+        values = {name: value for count_dict in count_dicts
+                  for name, value in count_dict.items()}
+        if len(values) != len(feature_names) or \
+                values.keys() != set(feature_names):
+            missing = [name for name in feature_names if name not in values]
+            additional = [name for name in values
+                          if name not in feature_names]
+            raise ValueError(f"Feature functions have to return the same "
+                             f"features for each instance. Features of "
+                             f"instance with text {instance['text']!r} "
+                             f"don't match the ones of the first instance. "
+                             f"Missing features: {missing}, additional "
+                             f"features: {additional}")
 
-        logger.info(f"Extracted features for "
-                    f"{len(list(itertools.chain(*data_splits)))} instances.")
+        return [values[name] for name in feature_names]
+
+    @staticmethod
+    def _set_features(dicts, feature_matrix, feature_schema,
+                      fingerprint=None, rows=None):
+        # Sets the feature vectors of the instances at the given rows, or
+        # of all instances if rows is None. Fingerprints of previous
+        # incremental runs are removed if no fingerprint is given.
+        if not len(dicts):
+            return
+
+        if isinstance(dicts, SampleStore):
+            # store feature vectors as one matrix in the columnar store
+            dicts.set_features(feature_matrix, feature_schema)
+            if fingerprint is not None:
+                dicts.set_column("feature_fingerprint",
+                                 [fingerprint] * len(dicts))
+            else:
+                dicts.delete_column("feature_fingerprint")
+        else:
+            if rows is None:
+                rows = range(len(dicts))
+            for row in rows:
+                instance = dicts[row]
+                instance["feature_vector"] = feature_matrix[row].tolist()
+                instance["feature_names"] = feature_schema
+                if fingerprint is not None:
+                    instance["feature_fingerprint"] = fingerprint
+                else:
+                    instance.pop("feature_fingerprint", None)
+
+    @staticmethod
+    def _get_outdated_rows(instances, fingerprint):
+        # Returns the positions of instances without feature vector or
+        # with a feature vector extracted with another configuration.
+        if isinstance(instances, SampleStore):
+            try:
+                fingerprints = instances.column("feature_fingerprint")
+            except KeyError:
+                return list(range(len(instances)))
+            return [row for row, (featurized, instance_fingerprint)
+                    in enumerate(zip(instances.is_featurized(), fingerprints))
+                    if not featurized or instance_fingerprint != fingerprint]
+
+        return [row for row, instance in enumerate(instances)
+                if "feature_vector" not in instance or
+                instance.get("feature_fingerprint") != fingerprint]
+
+    @staticmethod
+    def _get_previous_schema(data_splits, split_rows):
+        # Returns the feature names of the first instance whose feature
+        # vector is reused, or None if there is no such instance.
+        for split, rows in zip(data_splits, split_rows):
+            outdated_rows = set(rows)
+            for row in range(len(split)):
+                if row not in outdated_rows:
+                    return FeatureSchema(split[row]["feature_names"])
+
+        return None
+
+    @staticmethod
+    def _get_feature_matrix(instances, number_of_features, dtype=np.float64):
+        # Returns the feature vectors of the instances as matrix, rows of
+        # instances without feature vector are filled with NaN.
+        if isinstance(instances, SampleStore) and \
+                instances.feature_matrix is not None and \
+                instances.feature_matrix.shape[1] == number_of_features:
+            return np.array(instances.feature_matrix, dtype=dtype)
+
+        feature_matrix = np.full((len(instances), number_of_features), np.nan,
+                                 dtype=dtype)
+        for row, instance in enumerate(instances):
+            if "feature_vector" in instance:
+                feature_matrix[row] = instance["feature_vector"]
+
+        return feature_matrix
 
     def _char_based_features(self, instance, exclude=set()):
+        # map each char to a code for the char class it belongs to using
+        # a precomputed table and count the codes in C instead of
+        # classifying each char in Python
+        char_codes = instance["text"].translate(self._get_char_table(exclude))
+        code_counts = {code: char_codes.count(code) for code in _CHAR_CODES}
+
         counts = Counter({
-            "alpha": 0,
-            "upper": 0,
-            "lower": 0,
-            "numeric": 0,
-            "whitespace": 0,
-            "comma": 0,
-            "dot": 0,
-            "exclamation": 0,
-            "question": 0,
-            "colon": 0,
-            "semicolon": 0,
-            "hyphen": 0,
-            "at": 0,
-            "hashtag": 0,
+            "alpha": code_counts["U"] + code_counts["L"] + code_counts["A"],
+            "upper": code_counts["U"],
+            "lower": code_counts["L"],
+            "numeric": code_counts["N"],
+            "whitespace": code_counts["W"],
         })
-
-        for char in instance["text"]:
-            if char.isalpha() and "alpha" not in exclude:
-                counts["alpha"] += 1
-                if char.isupper() and "upper" not in exclude:
-                    counts["upper"] += 1
-                elif char.islower() and "lower" not in exclude:
-                    counts["lower"] += 1
-
-            elif char.isnumeric() and "numeric" not in exclude:
-                counts["numeric"] += 1
-            elif char.isspace() and "whitespace" not in exclude:
-                counts["whitespace"] += 1
-            elif char == "," and "comma" not in exclude:
-                counts["comma"] += 1
-            elif char == "." and "dot" not in exclude:
-                counts["dot"] += 1
-            elif char == "!" and "exclamation" not in exclude:
-                counts["exclamation"] += 1
-            elif char == "?" and "question" not in exclude:
-                counts["question"] += 1
-            elif char == ":" and "colon" not in exclude:
-                counts["colon"] += 1
-            elif char == ";" and "semicolon" not in exclude:
-                counts["semicolon"] += 1
-            elif char == "-" and "hyphen" not in exclude:
-                counts["hyphen"] += 1
-            elif char == "@" and "at" not in exclude:
-                counts["at"] += 1
-            elif char == "#" and "hashtag" not in exclude:
-                counts["hashtag"] += 1
+        for char, feature in _PUNCTUATION_FEATURES.items():
+            counts[feature] = code_counts[char]
 
         # normalize counts
         if self.normalize:
@@ -155,21 +851,29 @@ class TweetFeaturizer(BaseFeaturizer):
 
         return counts
 
+    def _get_char_table(self, exclude):
+        # Returns the translation table mapping chars to char class codes,
+        # which depends on the excluded features.
+        exclude = frozenset(exclude)
+        if exclude not in self._char_tables:
+            self._char_tables[exclude] = _CharTable(exclude)
+        return self._char_tables[exclude]
+
     def _word_based_features(self, instance, exclude=set()):
         counts = Counter()
 
-        counts["stop_words"] = sum(instance["is_stop"])
-        counts["emojis"] = sum(instance["is_emoji"])
+        counts["stop_words"] = instance["stop_word_count"]
+        if "emojis" not in exclude:
+            counts["emojis"] = instance["emoji_count"]
 
-        token_counts = len(instance["tokens"])
+        token_counts = instance["token_count"]
 
         if self.normalize:
             for feature, count in counts.items():
                 counts[feature] = counts[feature] / token_counts
 
         counts["token_counts"] = token_counts
-        counts["avg_token_len"] = mean(len(token)
-                                       for token in instance["tokens"])
+        counts["avg_token_len"] = instance["token_length_sum"] / token_counts
 
         for key in exclude:
             counts.pop(key, None)
@@ -181,11 +885,10 @@ class TweetFeaturizer(BaseFeaturizer):
             return
 
         counts = Counter({key: 0 for key in BaseFeaturizer.COARSE_POS_TAGS})
-        for pos_tag in instance["pos_tags"]:
-            counts[pos_tag] += 1
+        counts.update(instance["pos_tag_counts"])
 
         if self.normalize:
-            token_counts = len(instance["tokens"])
+            token_counts = instance["token_count"]
             for feature, count in counts.items():
                 counts[feature] = counts[feature] / token_counts
 
@@ -197,39 +900,451 @@ class TweetFeaturizer(BaseFeaturizer):
 
         counts = Counter({key: 0 for key in
                           self.spacy_model.pipe_labels["ner"]})
-        for named_entity in instance["named_entities"]:
-            counts[named_entity] += 1
+        counts.update(instance["named_entity_counts"])
 
         if self.normalize:
-            token_counts = len(instance["tokens"])
+            token_counts = instance["token_count"]
             for feature, count in counts.items():
                 counts[feature] = counts[feature] / token_counts
 
         return counts
 
-    def _add_spacy_annotations(self, data):
-        spacy_docs = self.spacy_model.pipe([sample["text"] for sample in data],
-                                           n_process=cpu_count())
-
-        for spacy_doc, sample in zip(spacy_docs, data):
-            tokens = []
-            lemmas = []
-            pos_tags = []
-            is_stop = []
-            is_emoji = []
-            for token in spacy_doc:
-                tokens.append(token.text)
-                lemmas.append(token.lemma_)
-                pos_tags.append(token.pos_)
-                is_stop.append(token.is_stop)
-                is_emoji.append(token._.is_emoji)
-
-            named_entities = [span.label_ for span in spacy_doc.ents]
-            sample.update(
-                tokens=tokens,
-                lemmas=lemmas,
-                pos_tags=pos_tags,
-                named_entities=named_entities,
-                is_stop=is_stop,
-                is_emoji=is_emoji,
-            )
+    def _get_batch_features(self, exclude=set()):
+        # Returns the batch feature functions together with their
+        # feature names and the columns of their results that are not
+        # excluded. Functions whose features are all excluded are not
+        # applied.
+        batch_features = []
+        for function, feature_names, parallel, columnar \
+                in self.batch_feature_functions:
+            columns = [column for column, name in enumerate(feature_names)
+                       if name not in exclude]
+            if columns:
+                batch_features.append((function, feature_names, columns,
+                                       parallel, columnar))
+
+        return batch_features
+
+    def _apply_batch_features(self, batch_features, chunk, feature_matrix,
+                              profiler):
+        # Writes the features of the batch feature functions for a chunk
+        # of annotated instances into the given part of the feature
+        # matrix.
+        column = 0
+        for function, feature_names, columns, parallel, columnar \
+                in batch_features:
+            name = getattr(function, "__name__", repr(function))
+            with profiler.stage(f"feature_function:{name}", len(chunk)):
+                if parallel and self._get_n_process() > 1 and len(chunk) > 1:
+                    # only picklable dicts can be sent to worker processes
+                    instances = [_to_plain_dict(instance)
+                                 for instance in chunk]
+                    n_batches = min(self._get_n_process(), len(instances))
+                    batch_size = -(-len(instances) // n_batches)
+                    batches = [(function, instances[start:start+batch_size],
+                                columnar)
+                               for start in range(0, len(instances),
+                                                  batch_size)]
+                    values = np.concatenate(
+                        self._get_pool().map(_apply_batch_function, batches))
+                else:
+                    values = _apply_batch_function((function, chunk,
+                                                    columnar))
+
+            if values.shape != (len(chunk), len(feature_names)):
+                raise ValueError(f"Batch feature function {name} has to "
+                                 f"return an array of shape ({len(chunk)}, "
+                                 f"{len(feature_names)}). Shape is: "
+                                 f"{values.shape}")
+            feature_matrix[:, column:column+len(columns)] = values[:, columns]
+            column += len(columns)
+
+    def _get_unavailable_annotations(self):
+        # Annotation fields that can't be extracted as the spaCy
+        # components providing them aren't run.
+        if not self.tokenizer_only:
+            return set()
+        return set(itertools.chain(self.PIPE_ANNOTATIONS["tagger"],
+                                   self.PIPE_ANNOTATIONS["ner"]))
+
+    def _check_required_annotations(self, required_annotations):
+        # Returns the annotation fields required by a custom feature
+        # function, defaulting to all available token-level fields.
+        unavailable_annotations = self._get_unavailable_annotations()
+        if required_annotations is None:
+            return set(self.ANNOTATION_FIELDS) - unavailable_annotations
+
+        required_annotations = set(required_annotations)
+        missing_annotations = required_annotations & unavailable_annotations
+        if missing_annotations:
+            raise ValueError(f"Annotations {sorted(missing_annotations)} are "
+                             f"not available in tokenizer-only mode.")
+        return required_annotations
+
+    def _get_required_annotations(self, exclude=set()):
+        # Determines which annotation fields are read by the feature
+        # functions given the excluded features.
+        required_annotations = set()
+        for function in self.feature_functions:
+            if function == self._char_based_features:
+                continue
+            elif function == self._word_based_features:
+                required_annotations.update(["token_count",
+                                             "token_length_sum",
+                                             "stop_word_count"])
+                if "emojis" not in exclude:
+                    required_annotations.add("emoji_count")
+            elif function == self._pos_features:
+                if "pos" not in exclude:
+                    required_annotations.update(["token_count",
+                                                 "pos_tag_counts"])
+            elif function == self._ner_features:
+                if "ner" not in exclude:
+                    required_annotations.update(["token_count",
+                                                 "named_entity_counts"])
+            else:
+                required_annotations.update(self._required_annotations.get(
+                    function, self.ANNOTATION_FIELDS))
+        for function, _, _, _, _ in self._get_batch_features(exclude):
+            required_annotations.update(self._required_annotations.get(
+                function, self.ANNOTATION_FIELDS))
+
+        return required_annotations - self._get_unavailable_annotations()
+
+    def _iter_spacy_annotations(self, data, exclude=set()):
+        # Yields the spaCy annotations of each instance in data, which
+        # only contain the annotation fields needed by the feature
+        # functions and, if annotations are kept, the token-level fields.
+        fields = self._get_required_annotations(exclude)
+
+        # disable spacy components whose annotations aren't needed
+        disabled_pipes = [
+            pipe for pipe, pipe_fields in self.PIPE_ANNOTATIONS.items()
+            if pipe in self.spacy_model.pipe_names and
+            not fields.intersection(pipe_fields)
+        ]
+        if disabled_pipes:
+            logger.debug(f"Disabling spaCy components {disabled_pipes}.")
+        if self.keep_annotations:
+            disabled_fields = set(itertools.chain.from_iterable(
+                self.PIPE_ANNOTATIONS[pipe] for pipe in disabled_pipes))
+            disabled_fields.update(self._get_unavailable_annotations())
+            fields.update(field for field in self.ANNOTATION_FIELDS
+                          if field not in disabled_fields)
+
+        # the worker pool has to be started before disabling components,
+        # as forked workers would keep the components disabled otherwise
+        use_pool = self._get_n_process() > 1 and len(data) > self.batch_size
+        if use_pool:
+            self._get_pool()
+
+        with self.spacy_model.disable_pipes(*disabled_pipes):
+            yield from self._annotate(data, fields, disabled_pipes, use_pool)
+
+    def _annotate(self, data, fields, disabled_pipes=(), use_pool=False):
+        texts = [sample["text"] for sample in data]
+        model_key = None
+        if self.annotation_cache is not None:
+            model_key = AnnotationCache.model_key(self.spacy_model, fields)
+
+        # annotations of texts occurring multiple times are kept for
+        # their later occurrences, all others are only yielded
+        duplicate_texts = {text for text, count in Counter(texts).items()
+                           if count > 1}
+        annotations = {}
+        # texts are looked up in the cache and annotated window by
+        # window, such that cached annotations are only held in memory
+        # for one window, which holds one batch per worker process
+        window_size = self.batch_size
+        if use_pool:
+            window_size *= self._get_n_process()
+        number_of_cached_texts = 0
+        for start in range(0, len(texts), window_size):
+            window = texts[start:start+window_size]
+            cached_annotations = {}
+            if self.annotation_cache is not None:
+                cached_annotations = self.annotation_cache.get_many(
+                    [text for text in window if text not in annotations],
+                    model_key)
+                number_of_cached_texts += len(cached_annotations)
+
+            uncached_texts = list(dict.fromkeys(
+                text for text in window
+                if text not in annotations and text not in cached_annotations
+            ))
+            text_annotations = self._annotate_texts(
+                uncached_texts, fields, disabled_pipes, use_pool)
+            new_annotations = {}
+            for text in window:
+                if text in annotations:
+                    text_annotation = annotations[text]
+                elif text in cached_annotations:
+                    text_annotation = cached_annotations[text]
+                else:
+                    text_annotation = next(text_annotations)
+                    new_annotations[text] = text_annotation
+                if text in duplicate_texts:
+                    annotations[text] = text_annotation
+                yield text_annotation
+
+            # write newly annotated texts to the cache
+            if self.annotation_cache is not None and new_annotations:
+                self.annotation_cache.put_many(new_annotations, model_key)
+
+        if self.annotation_cache is not None:
+            logger.debug(f"Found annotations for {number_of_cached_texts} "
+                         f"of {len(texts)} texts in annotation cache.")
+
+    def _annotate_texts(self, texts, fields, disabled_pipes=(),
+                        use_pool=False):
+        # Yields the annotations of each text, computed in the worker
+        # processes if there is more than one batch of texts.
+        if use_pool and len(texts) > self.batch_size:
+            batches = [(texts[start:start+self.batch_size], fields,
+                        disabled_pipes, self.emoji_backend,
+                        self.tokenizer_only)
+                       for start in range(0, len(texts), self.batch_size)]
+            return itertools.chain.from_iterable(
+                self._pool.imap(_annotate_batch, batches))
+
+        spacy_docs = _make_docs(self.spacy_model, texts, self.batch_size,
+                                self.tokenizer_only)
+        return (_get_doc_annotations(spacy_doc, fields, self.emoji_backend)
+                for spacy_doc in spacy_docs)
+
+    def _get_n_process(self):
+        if self.n_process is None:
+            return available_cpus()
+        return self.n_process
+
+    def _get_pool(self):
+        if self._pool is None:
+            global _worker_model
+            # forked workers inherit the already loaded model instead of
+            # loading it again
+            _worker_model = self.spacy_model
+            try:
+                self._pool = multiprocessing.Pool(
+                    self._get_n_process(),
+                    initializer=_init_annotation_worker,
+                    initargs=(self._model_bundle or self.lang_model,
+                              self.emoji_backend, self.tokenizer_only)
+                )
+            finally:
+                _worker_model = None
+            # the finalizer doesn't reference the featurizer, such that
+            # the pool is shut down when the featurizer is garbage
+            # collected
+            self._pool_finalizer = weakref.finalize(self, _terminate_pool,
+                                                    self._pool)
+
+        return self._pool
+
+
+def _function_identity(function):
+    # Returns a string identifying a feature function across processes
+    # and runs. Partials are identified by their function and
+    # arguments, lambdas additionally by their code, as they share
+    # their name, and callable objects by their class.
+    if isinstance(function, functools.partial):
+        arguments = [_argument_identity(argument)
+                     for argument in function.args] + \
+            [f"{key}={_argument_identity(value)}"
+             for key, value in sorted(function.keywords.items())]
+        return f"functools.partial({_function_identity(function.func)}, " \
+               f"{', '.join(arguments)})"
+
+    name = getattr(function, "__qualname__", None)
+    if name is None:
+        function_type = type(function)
+        return f"{function_type.__module__}.{function_type.__qualname__}"
+
+    identity = f"{getattr(function, '__module__', None)}.{name}"
+    code = getattr(function, "__code__", None)
+    if "<lambda>" in name and code is not None:
+        identity += f":{_code_digest(code)}"
+    return identity
+
+
+def _argument_identity(argument):
+    # functions are represented with their memory address
+    if callable(argument):
+        return _function_identity(argument)
+    return repr(argument)
+
+
+def _code_digest(code):
+    # Hash of a code object's bytecode, constants and names. Nested code
+    # objects, e.g. of comprehensions, are hashed the same way, as their
+    # representation contains their memory address.
+    constants = [_code_digest(constant) if isinstance(constant, type(code))
+                 else repr(constant) for constant in code.co_consts]
+    return hashlib.sha1(code.co_code + repr((constants, code.co_names))
+                        .encode("utf-8")).hexdigest()
+
+
+# spaCy model used by annotation worker processes
+_worker_model = None
+
+
+def _load_spacy_model(lang_model, emoji_backend="builtin",
+                      tokenizer_only=False):
+    # spaCy is imported here, such that processes that only load a
+    # featurizer without extracting features don't have to import it
+    import spacy
+
+    disabled_pipes = ["parser"]
+    if tokenizer_only:
+        disabled_pipes += ["tagger", "ner"]
+    try:
+        # initialize spacy model
+        spacy_model = spacy.load(lang_model, disable=disabled_pipes)
+        if emoji_backend == "spacymoji":
+            from spacymoji import Emoji
+            emoji_detector = Emoji(spacy_model)
+            spacy_model.add_pipe(emoji_detector, first=True)
+    except OSError:
+        # user inserted an unknown model name
+        raise ModuleNotFoundError(
+            f"Language model '{lang_model}' not installed.\n"
+            f"\tTo install the model, execute: 'python -m spacy download "
+            f"{lang_model}'\n"
+            f"\tAvailable models can be found at: "
+            f"https://spacy.io/usage/models"
+        )
+
+    return spacy_model
+
+
+def _init_annotation_worker(lang_model, emoji_backend, tokenizer_only=False):
+    global _worker_model
+    if _worker_model is None:
+        _worker_model = _load_spacy_model(lang_model, emoji_backend,
+                                          tokenizer_only)
+
+
+def _terminate_pool(pool):
+    pool.terminate()
+    pool.join()
+
+
+def _annotate_batch(batch):
+    texts, fields, disabled_pipes, emoji_backend, tokenizer_only = batch
+    with _worker_model.disable_pipes(*disabled_pipes):
+        return [_get_doc_annotations(spacy_doc, fields, emoji_backend)
+                for spacy_doc in _make_docs(_worker_model, texts, len(texts),
+                                            tokenizer_only)]
+
+
+def _make_docs(spacy_model, texts, batch_size, tokenizer_only=False):
+    # Runs either the whole pipeline or only the tokenizer over texts.
+    if tokenizer_only:
+        return spacy_model.tokenizer.pipe(texts, batch_size=batch_size)
+    return spacy_model.pipe(texts, batch_size=batch_size)
+
+
+def _apply_batch_function(batch):
+    function, instances, columnar = batch
+    if columnar:
+        fields = dict.fromkeys(itertools.chain.from_iterable(instances))
+        fields.pop("feature_vector", None)
+        fields.pop("feature_names", None)
+        instances = {field: [instance.get(field) for instance in instances]
+                     for field in fields}
+    return np.asarray(function(instances), dtype=np.float64)
+
+
+def _to_plain_dict(annotated_instance):
+    # Copies an instance and its annotations into a dict without the
+    # instance's feature vector.
+    return {key: annotated_instance[key] for key in annotated_instance
+            if key not in ("feature_vector", "feature_names")}
+
+
+_PUNCTUATION_FEATURES = {",": "comma", ".": "dot", "!": "exclamation",
+                         "?": "question", ":": "colon", ";": "semicolon",
+                         "-": "hyphen", "@": "at", "#": "hashtag"}
+
+
+# codes of char classes: alpha and upper, alpha and lower, alpha only,
+# numeric, whitespace and the punctuation chars themselves
+_CHAR_CODES = "ULANW" + "".join(_PUNCTUATION_FEATURES)
+
+
+class _CharTable(dict):
+    """
+    Translation table for :code:`str.translate` that maps code points
+    to the code of their char class. Chars are classified the first
+    time they are looked up, chars that don't belong to any class are
+    mapped to None, i.e. removed.
+    """
+
+    def __init__(self, exclude=frozenset()):
+        super().__init__()
+        self.exclude = exclude
+
+    def __missing__(self, code_point):
+        char_code = _classify_char(chr(code_point), self.exclude)
+        self[code_point] = char_code
+        return char_code
+
+    def __reduce__(self):
+        return _CharTable, (self.exclude,)
+
+
+def _classify_char(char, exclude=frozenset()):
+    # Returns the code of the char class a char is counted for. An
+    # excluded feature doesn't count the char, and the char is checked
+    # against the next feature instead.
+    if char.isalpha() and "alpha" not in exclude:
+        if char.isupper() and "upper" not in exclude:
+            return "U"
+        elif char.islower() and "lower" not in exclude:
+            return "L"
+        return "A"
+    elif char.isnumeric() and "numeric" not in exclude:
+        return "N"
+    elif char.isspace() and "whitespace" not in exclude:
+        return "W"
+    elif char in _PUNCTUATION_FEATURES and \
+            _PUNCTUATION_FEATURES[char] not in exclude:
+        return char
+    return None
+
+
+# functions extracting each annotation field from a spaCy Doc
+_ANNOTATION_EXTRACTORS = {
+    "tokens": lambda doc: [token.text for token in doc],
+    "lemmas": lambda doc: [token.lemma_ for token in doc],
+    "pos_tags": lambda doc: [token.pos_ for token in doc],
+    "named_entities": lambda doc: [span.label_ for span in doc.ents],
+    "is_stop": lambda doc: [token.is_stop for token in doc],
+    "token_count": len,
+    "token_length_sum": lambda doc: sum(len(token.text) for token in doc),
+    "stop_word_count": lambda doc: sum(token.is_stop for token in doc),
+    "pos_tag_counts": lambda doc: dict(Counter(token.pos_ for token in doc)),
+    "named_entity_counts":
+        lambda doc: dict(Counter(span.label_ for span in doc.ents)),
+}
+
+
+# functions extracting the emoji annotation fields for each emoji backend
+_EMOJI_EXTRACTORS = {
+    "builtin": {
+        "is_emoji": lambda doc: [is_emoji(token.text) for token in doc],
+        "emoji_count": lambda doc: count_emojis(doc.text),
+    },
+    "spacymoji": {
+        "is_emoji": lambda doc: [token._.is_emoji for token in doc],
+        "emoji_count": lambda doc: sum(token._.is_emoji for token in doc),
+    },
+}
+
+
+def _get_doc_annotations(spacy_doc, fields, emoji_backend="builtin"):
+    # Extracts the given annotation fields from a spaCy Doc. Fields
+    # that aren't extracted from Docs, e.g. custom ones, are skipped.
+    extractors = itertools.chain(_ANNOTATION_EXTRACTORS.items(),
+                                 _EMOJI_EXTRACTORS[emoji_backend].items())
+    return {field: extractor(spacy_doc) for field, extractor in extractors
+            if field in fields}
@@ -24,6 +24,10 @@ class BasePreprocessor(ABC):
             ...
         ]
 
+    To keep memory usage low on large data sets, data splits may be
+    stored in a columnar :class:`SampleStore` instead of a list, which
+    stores each field in one list and the feature vectors in a single
+    matrix, but can be used like a list of dictionaries.
     """
 
     @classmethod
@@ -1,30 +1,62 @@
+import bz2
 import csv
+import glob
+import gzip
+import lzma
+import hashlib
+import os
 import random
 import logging
+import itertools
+from concurrent.futures import ProcessPoolExecutor
 
+from text_classification.featurizer.schema import FeatureSchema
 from text_classification.preprocessor.base import BasePreprocessor
+from text_classification.preprocessor.feature_matrix import (
+    save_feature_matrix, load_feature_matrix, saved_splits)
+from text_classification.preprocessor.sample_store import SampleStore
+from text_classification.profiling import get_profiler
 
 logger = logging.getLogger(__name__)
 
+# opener, file extensions and magic bytes of supported compression codecs
+_COMPRESSION_CODECS = [
+    (gzip.open, (".gz", ".gzip"), b"\x1f\x8b"),
+    (bz2.open, (".bz2",), b"BZh"),
+    (lzma.open, (".xz", ".lzma"), b"\xfd7zXZ\x00"),
+]
+
 
 class CSVPreprocessor(BasePreprocessor):
     """
     Preprocessor that is able to read a csv-file and do train/test/dev
     split. A preprocessor instance serves as a samples storage whose
     instances can be extended with feature vectors and predictions.
+    Each data split is held in a columnar :class:`SampleStore`.
+    Files compressed with gzip, bzip2 or xz are read and written
+    transparently, the compression is detected by the file extension
+    (.gz, .bz2, .xz) or, when reading, by the file's content.
     """
 
     def __init__(self, train_filename=None, test_filename=None,
                  dev_filename=None, test_split=0, dev_split=0, delimiter="\t",
-                 text_column="text", label_column="label", random_state=None):
+                 text_column="text", label_column="label", random_state=None,
+                 n_workers=1, max_rows_per_shard=None, split_mode="shuffle",
+                 id_column=None, profiler=None):
         """
 
-        :param train_filename: Train set file.
-        :type train_filename: str
-        :param test_filename:  Test set file.
-        :type test_filename: str
-        :param dev_filename: Dev set file.
-        :type dev_filename: str
+        Each of the filename arguments may be a single file, a glob
+        pattern (e.g. :code:`"data/tweets_*.tsv"`) or a list of files
+        and glob patterns. Multiple files (=shards) are merged in the
+        given order, where files matching a glob pattern are sorted by
+        name.
+
+        :param train_filename: Train set file(s).
+        :type train_filename: Union[str, List[str]]
+        :param test_filename:  Test set file(s).
+        :type test_filename: Union[str, List[str]]
+        :param dev_filename: Dev set file(s).
+        :type dev_filename: Union[str, List[str]]
         :param test_split: Fraction of train set that should be used as
             test set.
         :type test_split: float
@@ -37,20 +69,39 @@ class CSVPreprocessor(BasePreprocessor):
         :type text_column: str
         :param label_column: Column in csv-file containing label.
         :type label_column: str
-        :param random_state: Random state for shuffling samples.
+        :param random_state: Random state for shuffling samples or salt
+            for hashing samples.
         :type random_state: int
+        :param n_workers: Number of processes used to read multiple
+            files in parallel.
+        :type n_workers: int
+        :param max_rows_per_shard: Maximum number of rows to read from
+            each file. If None, all rows are read.
+        :type max_rows_per_shard: int
+        :param split_mode: How to split the train file(s) into train,
+            test and dev set. "shuffle" shuffles all samples and takes
+            the first samples as test and dev set. "hash" assigns each
+            sample based on a stable hash of its text (or id), which
+            doesn't depend on the order of the samples and leaves the
+            global random state untouched.
+        :type split_mode: str
+        :param id_column: Column in csv-file containing an id that is
+            hashed instead of the text if split_mode is "hash".
+        :type id_column: str
+        :param profiler: Profiler measuring the time spent reading the
+            files as stage "read".
+        :type profiler: Profiler
         """
 
-        random.seed(random_state)
+        if split_mode not in ("shuffle", "hash"):
+            raise ValueError(f"split_mode has to be one of the following "
+                             f"values: 'shuffle', 'hash'. split_mode is: "
+                             f"{split_mode}")
 
         if train_filename:
-            logger.info(f"Reading {train_filename}...")
-
-            data = self._extract_data(train_filename, delimiter, text_column,
-                                      label_column)
-            # shuffle samples if we want to use part of it as train or dev set
-            if test_split or dev_split:
-                random.shuffle(data)
+            data = self._read_files(train_filename, delimiter, text_column,
+                                    label_column, n_workers,
+                                    max_rows_per_shard, id_column, profiler)
 
             # check whether test_split and dev_split are valid
             if not (0 <= test_split <= 1):
@@ -69,44 +120,66 @@ class CSVPreprocessor(BasePreprocessor):
                     f"than 1. Sum is: {dev_split + test_split}"
                 )
 
-            # calculate number of dev and test samples
-            number_of_test_samples = int(len(data) * test_split)
-            number_of_dev_samples = int(len(data) * dev_split)
-
-            # split samples into train, test and dev sets
-            self.test = data[:number_of_test_samples]
-            self.dev = data[number_of_test_samples:
-                            number_of_test_samples+number_of_dev_samples]
-            self.train = data[number_of_test_samples+number_of_dev_samples:]
+            if split_mode == "hash":
+                # assign each sample to a split based on the hash of its
+                # text or id
+                keys = data.column(id_column or "text")
+                split_indices = {"train": [], "test": [], "dev": []}
+                for idx, key in enumerate(keys):
+                    split = self.hash_split(key, test_split, dev_split,
+                                            random_state)
+                    split_indices[split].append(idx)
+
+                self.train = data.take(split_indices["train"])
+                self.test = data.take(split_indices["test"])
+                self.dev = data.take(split_indices["dev"])
+            else:
+                # shuffle samples if we want to use part of it as train or
+                # dev set
+                if test_split or dev_split:
+                    indices = list(range(len(data)))
+                    random.Random(random_state).shuffle(indices)
+                    data = data.take(indices)
+
+                # calculate number of dev and test samples
+                number_of_test_samples = int(len(data) * test_split)
+                number_of_dev_samples = int(len(data) * dev_split)
+
+                # split samples into train, test and dev sets
+                self.test = data[:number_of_test_samples]
+                self.dev = data[number_of_test_samples:
+                                number_of_test_samples+number_of_dev_samples]
+                self.train = data[number_of_test_samples +
+                                  number_of_dev_samples:]
 
             # add external test and dev samples
             if test_filename:
-                logging.info(f"Reading {test_filename}...")
-
-                self.test += self._extract_data(test_filename, delimiter,
-                                                text_column, label_column)
+                self.test += self._read_files(test_filename, delimiter,
+                                              text_column, label_column,
+                                              n_workers, max_rows_per_shard,
+                                              profiler=profiler)
             if dev_filename:
-                logging.info(f"Reading {dev_filename}...")
-
-                self.dev += self._extract_data(dev_filename, delimiter,
-                                               text_column, label_column)
+                self.dev += self._read_files(dev_filename, delimiter,
+                                             text_column, label_column,
+                                             n_workers, max_rows_per_shard,
+                                             profiler=profiler)
         else:
-            self.train = []
+            self.train = SampleStore()
 
             if test_filename:
-                logging.info(f"Reading {test_filename}...")
-
-                self.test = self._extract_data(test_filename, delimiter,
-                                               text_column, label_column)
+                self.test = self._read_files(test_filename, delimiter,
+                                             text_column, label_column,
+                                             n_workers, max_rows_per_shard,
+                                             profiler=profiler)
             else:
-                self.test = []
+                self.test = SampleStore()
             if dev_filename:
-                logging.info(f"Reading {dev_filename}...")
-
-                self.dev = self._extract_data(dev_filename, delimiter,
-                                              text_column, label_column)
+                self.dev = self._read_files(dev_filename, delimiter,
+                                            text_column, label_column,
+                                            n_workers, max_rows_per_shard,
+                                            profiler=profiler)
             else:
-                self.dev = []
+                self.dev = SampleStore()
 
     def get_data(self):
         """
@@ -129,7 +202,7 @@ class CSVPreprocessor(BasePreprocessor):
        Returns test set.
 
        :return: Test set.
-       :rtype: List[dict]
+       :rtype: SampleStore
        """
         return self.test
 
@@ -144,16 +217,18 @@ class CSVPreprocessor(BasePreprocessor):
     @classmethod
     def from_file(cls, train_filename=None, test_filename=None,
                   dev_filename=None, test_split=0, dev_split=0, delimiter="\t",
-                  text_column="text", label_column="label", random_state=None):
+                  text_column="text", label_column="label", random_state=None,
+                  n_workers=1, max_rows_per_shard=None, split_mode="shuffle",
+                  id_column=None, profiler=None):
         """
         Load samples from csv-files.
 
-        :param train_filename: Train set file.
-        :type train_filename: str
-        :param test_filename:  Test set file.
-        :type test_filename: str
-        :param dev_filename: Dev set file.
-        :type dev_filename: str
+        :param train_filename: Train set file(s) or glob pattern.
+        :type train_filename: Union[str, List[str]]
+        :param test_filename:  Test set file(s) or glob pattern.
+        :type test_filename: Union[str, List[str]]
+        :param dev_filename: Dev set file(s) or glob pattern.
+        :type dev_filename: Union[str, List[str]]
         :param test_split: Fraction of train set that should be used as
             test set.
         :type test_split: float
@@ -166,14 +241,36 @@ class CSVPreprocessor(BasePreprocessor):
         :type text_column: str
         :param label_column: Column in csv-file containing label.
         :type label_column: str
-        :param random_state: Random state for shuffling samples.
+        :param random_state: Random state for shuffling samples or salt
+            for hashing samples.
         :type random_state: int
+        :param n_workers: Number of processes used to read multiple
+            files in parallel.
+        :type n_workers: int
+        :param max_rows_per_shard: Maximum number of rows to read from
+            each file. If None, all rows are read.
+        :type max_rows_per_shard: int
+        :param split_mode: How to split the train file(s) into train,
+            test and dev set. "shuffle" shuffles all samples and takes
+            the first samples as test and dev set. "hash" assigns each
+            sample based on a stable hash of its text (or id), which
+            doesn't depend on the order of the samples and leaves the
+            global random state untouched.
+        :type split_mode: str
+        :param id_column: Column in csv-file containing an id that is
+            hashed instead of the text if split_mode is "hash".
+        :type id_column: str
+        :param profiler: Profiler measuring the time spent reading the
+            files as stage "read".
+        :type profiler: Profiler
         :return: CSVPreprocessor instance
         """
 
         return cls(train_filename, test_filename, dev_filename, test_split,
                    dev_split, delimiter, text_column, label_column,
-                   random_state)
+                   random_state, n_workers, max_rows_per_shard,
+                   split_mode=split_mode, id_column=id_column,
+                   profiler=profiler)
 
     def write_csv(self, filename, delimiter="\t", set="test"):
         """
@@ -199,7 +296,7 @@ class CSVPreprocessor(BasePreprocessor):
                              f" 'test', 'train', 'dev'. Arg set is: {set}")
 
     def _write_csv(self, filename, delimiter, set):
-        with open(filename, "w") as file:
+        with self._open_file(filename, "w") as file:
             csv_writer = csv.writer(file, delimiter=delimiter)
             csv_writer.writerow(["text", "label", "prediction"])
             for instance in set:
@@ -221,39 +318,271 @@ class CSVPreprocessor(BasePreprocessor):
         :type set: str
         """
         logger.info(f"Writing {set} feature vectors to {filename}...")
-        if set == "test":
-            self._write_csv(filename, delimiter, self.get_test_data())
-        elif set == "dev":
-            self._write_csv(filename, delimiter, self.get_dev_data())
-        elif set == "train":
-            self._write_csv(filename, delimiter, self.get_train_data())
-        else:
-            raise ValueError(f"Arg set has to be one of the following values:"
-                             f" 'test', 'train', 'dev'. Arg set is: {set}")
+        self._write_feature_vectors(filename, delimiter, self._get_split(set))
 
     def _write_feature_vectors(self, filename, delimiter, set):
-        with open(filename, "w") as file:
+        with self._open_file(filename, "w") as file:
             csv_writer = csv.writer(file, delimiter=delimiter)
             try:
                 feat_names = set[0]["feature_names"]
                 csv_writer.writerow(["text", "label", "prediction"] +
-                                    feat_names)
+                                    list(feat_names))
             except IndexError:
                 logger.warning("Cannot write feature vectors for empty set.")
+                return
             except KeyError:
                 logger.warning("No feature vectors available. Please extract "
                                "features before wanting to write feature "
                                "vectors.")
+                return
             for instance in set:
                 row = [instance.get("text", ""),
                        instance.get("label", ""),
                        instance.get("prediction", "")] + \
-                      instance.get("feature_names", [0 for feat in feat_names])
+                      list(instance.get("feature_vector",
+                                        [0 for feat in feat_names]))
                 csv_writer.writerow(row)
 
+    def write_feature_matrix(self, directory, set="train"):
+        """
+        Write the feature matrix, labels and feature names of a samples
+        set in binary format to a directory, such that they can be
+        loaded again without parsing text or extracting features using
+        :meth:`from_feature_matrix`. The feature matrix and labels are
+        saved as :code:`.npy`-files, the feature names in a JSON
+        manifest shared by all sets written to the same directory.
+
+        :param directory: Directory to write the files to.
+        :type directory: str
+        :param set: From which samples set to write the feature matrix.
+            Possible values: "train", "test", "dev"
+        :type set: str
+        """
+        logger.info(f"Writing {set} feature matrix to {directory}...")
+        samples = self._get_split(set)
+        if not isinstance(samples, SampleStore):
+            samples = SampleStore.from_dicts(samples)
+
+        if samples.feature_matrix is None or \
+                not samples.is_featurized().all():
+            raise ValueError(f"Not all instances of the {set} set contain a "
+                             f"feature vector. Please extract features "
+                             f"before wanting to write the feature matrix.")
+
+        try:
+            labels = samples.column("label")
+        except KeyError:
+            labels = None
+        if labels is not None and None in labels:
+            logger.warning(f"Not all instances of the {set} set contain a "
+                           f"label. Writing feature matrix without labels.")
+            labels = None
+
+        save_feature_matrix(directory, set, samples.feature_matrix,
+                            samples.feature_names, labels)
+
+    @classmethod
+    def from_feature_matrix(cls, directory, mmap=True):
+        """
+        Loads samples sets previously written with
+        :meth:`write_feature_matrix`. The resulting instances contain
+        the keys "feature_vector", "feature_names" and, if available,
+        "label", but no text.
+
+        :param directory: Directory the feature matrices were written
+            to.
+        :type directory: str
+        :param mmap: Whether to memory-map the feature matrices
+            read-only instead of reading them into memory.
+        :type mmap: bool
+        :return: CSVPreprocessor instance
+        """
+        logger.info(f"Loading feature matrices from {directory}...")
+        preprocessor = cls()
+        for set in saved_splits(directory):
+            if set not in ("train", "test", "dev"):
+                continue
+            feature_matrix, labels, feature_names = load_feature_matrix(
+                directory, set, mmap=mmap)
+            columns = {}
+            if labels is not None:
+                columns["label"] = labels.tolist()
+            setattr(preprocessor, set,
+                    SampleStore(columns, feature_matrix,
+                                FeatureSchema(feature_names)))
+
+        return preprocessor
+
+    def _get_split(self, set):
+        if set == "test":
+            return self.get_test_data()
+        elif set == "dev":
+            return self.get_dev_data()
+        elif set == "train":
+            return self.get_train_data()
+        else:
+            raise ValueError(f"Arg set has to be one of the following values:"
+                             f" 'test', 'train', 'dev'. Arg set is: {set}")
+
+    @staticmethod
+    def hash_split(key, test_split=0, dev_split=0, random_state=None):
+        """
+        Assigns a sample to the train, test or dev set based on a stable
+        hash of a key, e.g. its text or id. The assignment only depends
+        on the key, the split fractions and the random state, so it is
+        reproducible across shards, processes and machines and can be
+        used while streaming samples.
+
+        :param key: Text or id of the sample.
+        :type key: str
+        :param test_split: Fraction of samples that should be assigned
+            to the test set.
+        :type test_split: float
+        :param dev_split: Fraction of samples that should be assigned
+            to the dev set.
+        :type dev_split: float
+        :param random_state: Salt for the hash function.
+        :type random_state: int
+        :return: "train", "test" or "dev"
+        """
+        salt = "" if random_state is None else f"{random_state}:"
+        digest = hashlib.md5(f"{salt}{key}".encode("utf-8")).digest()
+        # map first 8 bytes of the digest to a number in [0, 1)
+        position = int.from_bytes(digest[:8], "big") / 2 ** 64
+
+        if position < test_split:
+            return "test"
+        if position < test_split + dev_split:
+            return "dev"
+        return "train"
+
+    @classmethod
+    def iter_chunks(cls, filename, chunk_size=10000, delimiter="\t",
+                    text_column="text", label_column="label"):
+        """
+        Lazily reads a csv-file and yields its instances in chunks of
+        fixed size, such that only one chunk has to be kept in memory
+        at a time. Each chunk is a list of dictionaries in the same
+        format as the data splits of a CSVPreprocessor and can be
+        passed to :code:`TweetFeaturizer.extract_features_from_dicts`
+        and :code:`ClassAverageClassifier.predict_from_dicts`.
+
+        :param filename: File(s) or glob pattern to read the instances
+            from.
+        :type filename: Union[str, List[str]]
+        :param chunk_size: Maximum number of instances per chunk.
+        :type chunk_size: int
+        :param delimiter: Delimiter that is used in csv-file.
+        :type delimiter: str
+        :param text_column: Column in csv-file containing text.
+        :type text_column: str
+        :param label_column: Column in csv-file containing label.
+        :type label_column: str
+        :return: Generator yielding lists of dicts.
+        """
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size should be a positive integer. "
+                             f"chunk_size is: {chunk_size}")
+
+        logger.info(f"Streaming {filename} in chunks of {chunk_size} "
+                    f"instances...")
+        rows = itertools.chain.from_iterable(
+            cls._read_rows(shard, delimiter, text_column, label_column)
+            for shard in cls.expand_filenames(filename)
+        )
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            yield chunk
+
+    @classmethod
+    def _read_files(cls, filenames, delimiter, text_column, label_column,
+                    n_workers=1, max_rows_per_shard=None, id_column=None,
+                    profiler=None):
+        filenames = cls.expand_filenames(filenames)
+        for filename in filenames:
+            logger.info(f"Reading {filename}...")
+
+        read_args = (delimiter, text_column, label_column, max_rows_per_shard,
+                     id_column)
+        with get_profiler(profiler).stage("read") as stage:
+            if n_workers > 1 and len(filenames) > 1:
+                # executor.map returns results in order of filenames, which
+                # keeps merged splits deterministic
+                with ProcessPoolExecutor(max_workers=min(
+                        n_workers, len(filenames))) as executor:
+                    shards = list(executor.map(
+                        cls._extract_data, filenames,
+                        *[itertools.repeat(arg) for arg in read_args]
+                    ))
+            else:
+                shards = [cls._extract_data(filename, *read_args)
+                          for filename in filenames]
+
+            data = SampleStore.concatenate(shards)
+            stage.instances = len(data)
+
+        return data
+
     @staticmethod
-    def _extract_data(filename, delimiter, text_column, label_column):
-        with open(filename, "r") as file:
+    def expand_filenames(filenames):
+        """
+        Expands glob patterns in filenames to the matching files in
+        alphabetical order.
+
+        :param filenames: Filename, glob pattern or list of them.
+        :type filenames: Union[str, os.PathLike, List[str]]
+        :return: List of filenames.
+        """
+        if isinstance(filenames, (str, os.PathLike)):
+            filenames = [filenames]
+
+        expanded_filenames = []
+        for filename in map(os.fspath, filenames):
+            if any(char in filename for char in "*?["):
+                matches = sorted(glob.glob(filename))
+                if not matches:
+                    raise FileNotFoundError(f"No files match the pattern "
+                                            f"'{filename}'.")
+                expanded_filenames += matches
+            else:
+                expanded_filenames.append(filename)
+
+        return expanded_filenames
+
+    @classmethod
+    def _extract_data(cls, filename, delimiter, text_column, label_column,
+                      max_rows=None, id_column=None):
+        rows = cls._read_rows(filename, delimiter, text_column, label_column,
+                              id_column)
+        return SampleStore.from_dicts(itertools.islice(rows, max_rows))
+
+    @staticmethod
+    def _open_file(filename, mode):
+        # Opens a file in text mode, (de-)compressing it on the fly if it
+        # is gzip, bzip2 or xz compressed. The codec is detected by the
+        # file extension or, when reading, by the file's magic bytes.
+        filename = os.fspath(filename)
+        codec = None
+        for opener, extensions, _ in _COMPRESSION_CODECS:
+            if filename.endswith(extensions):
+                codec = opener
+        if codec is None and mode == "r":
+            with open(filename, "rb") as file:
+                header = file.read(6)
+            for opener, _, magic_bytes in _COMPRESSION_CODECS:
+                if header.startswith(magic_bytes):
+                    codec = opener
+
+        if codec is None:
+            return open(filename, mode, newline="")
+        return codec(filename, mode + "t", newline="")
+
+    @staticmethod
+    def _read_rows(filename, delimiter, text_column, label_column,
+                   id_column=None):
+        with CSVPreprocessor._open_file(filename, "r") as file:
             csv_reader = csv.reader(file, delimiter=delimiter)
             try:
                 headers = next(csv_reader)
@@ -269,12 +598,24 @@ class CSVPreprocessor(BasePreprocessor):
                                  f"name.")
             try:
                 label_col_idx = headers.index(label_column)
-                data = [{"text": row[text_col_idx],
-                         "label": row[label_col_idx]}
-                        for row in csv_reader]
             except ValueError:
                 logger.warning(f"Reading data from {filename} without label, "
                                f"as column {label_column} does not exist.")
-                data = [{"text": row[text_col_idx]} for row in csv_reader]
-
-        return data
+                label_col_idx = None
+            if id_column is not None:
+                try:
+                    id_col_idx = headers.index(id_column)
+                except ValueError:
+                    raise ValueError(f"'{id_column}' not a column of "
+                                     f"{filename}. Please provide id column "
+                                     f"name.")
+
+            for row in csv_reader:
+                if label_col_idx is None:
+                    instance = {"text": row[text_col_idx]}
+                else:
+                    instance = {"text": row[text_col_idx],
+                                "label": row[label_col_idx]}
+                if id_column is not None:
+                    instance[id_column] = row[id_col_idx]
+                yield instance
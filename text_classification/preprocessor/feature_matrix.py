@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "manifest.json"
+FORMAT_VERSION = 1
+
+
+def save_feature_matrix(directory, split, feature_matrix, feature_names,
+                        labels=None):
+    """
+    Saves the feature matrix and labels of a data split in binary
+    :code:`.npy` format and registers them in the JSON manifest of the
+    directory, which also holds the feature names shared by all splits.
+    ::
+        directory/
+            manifest.json
+            train_features.npy
+            train_labels.npy
+
+    :param directory: Directory to write the files to. It is created if
+        it doesn't exist.
+    :type directory: str
+    :param split: Name of the data split, e.g. "train".
+    :type split: str
+    :param feature_matrix: 2-D matrix containing one feature vector per
+        row.
+    :type feature_matrix: numpy.ndarray
+    :param feature_names: Names of the features, i.e. the columns of the
+        feature matrix.
+    :type feature_names: List[str]
+    :param labels: Label of each row. If None, no labels are saved.
+    :type labels: List[str]
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = _read_manifest(directory)
+    feature_names = list(feature_names)
+
+    if manifest["feature_names"] is not None and \
+            manifest["feature_names"] != feature_names:
+        logger.warning(f"Feature names of split '{split}' don't match the "
+                       f"ones in {directory}. Previously saved splits are "
+                       f"removed from the manifest.")
+        manifest["splits"] = {}
+    manifest["feature_names"] = feature_names
+
+    features_filename = f"{split}_features.npy"
+    np.save(os.path.join(directory, features_filename),
+            np.ascontiguousarray(feature_matrix))
+
+    labels_filename = None
+    if labels is not None:
+        labels_filename = f"{split}_labels.npy"
+        np.save(os.path.join(directory, labels_filename),
+                np.array(labels, dtype=str))
+
+    manifest["splits"][split] = {
+        "rows": int(feature_matrix.shape[0]),
+        "dtype": str(feature_matrix.dtype),
+        "features": features_filename,
+        "labels": labels_filename,
+    }
+    with open(os.path.join(directory, MANIFEST_FILENAME), "w") as file:
+        json.dump(manifest, file, indent=2)
+
+
+def load_feature_matrix(directory, split, mmap=True):
+    """
+    Loads the feature matrix, labels and feature names of a data split
+    saved with :func:`save_feature_matrix`.
+
+    :param directory: Directory containing the manifest.
+    :type directory: str
+    :param split: Name of the data split, e.g. "train".
+    :type split: str
+    :param mmap: Whether to memory-map the feature matrix and labels
+        read-only instead of reading them into memory.
+    :type mmap: bool
+    :return: Tuple with feature matrix, labels (or None) and feature
+        names.
+    """
+    manifest = _read_manifest(directory)
+    if split not in manifest["splits"]:
+        raise KeyError(f"No feature matrix for split '{split}' in "
+                       f"{directory}. Available splits: "
+                       f"{list(manifest['splits'])}")
+
+    split_info = manifest["splits"][split]
+    mmap_mode = "r" if mmap else None
+    feature_matrix = np.load(os.path.join(directory, split_info["features"]),
+                             mmap_mode=mmap_mode)
+    labels = None
+    if split_info["labels"] is not None:
+        labels = np.load(os.path.join(directory, split_info["labels"]),
+                         mmap_mode=mmap_mode)
+
+    return feature_matrix, labels, manifest["feature_names"]
+
+
+def saved_splits(directory):
+    """
+    Returns the names of the data splits saved in a directory.
+
+    :param directory: Directory containing the manifest.
+    :type directory: str
+    :return: List of split names.
+    """
+    return list(_read_manifest(directory)["splits"])
+
+
+def _read_manifest(directory):
+    manifest_path = os.path.join(directory, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return {"format_version": FORMAT_VERSION, "feature_names": None,
+                "splits": {}}
+
+    with open(manifest_path, "r") as file:
+        manifest = json.load(file)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported feature matrix format version "
+                         f"{manifest.get('format_version')} in "
+                         f"{manifest_path}.")
+
+    return manifest
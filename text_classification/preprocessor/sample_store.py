@@ -0,0 +1,493 @@
+from collections.abc import MutableMapping, Sequence
+
+import numpy as np
+
+
+class _Missing:
+    """
+    Type of the marker for fields that are not set for an instance.
+    The marker is pickled by reference, such that it is still
+    recognized after unpickling a SampleStore.
+    """
+
+    __slots__ = ()
+
+    def __reduce__(self):
+        return "_MISSING"
+
+    def __repr__(self):
+        return "_MISSING"
+
+
+# marks fields that are not set for an instance
+_MISSING = _Missing()
+
+
+class SampleStore(Sequence):
+    """
+    Columnar storage for the instances of one data split. Instead of
+    keeping one dictionary per instance, each field (e.g.
+    :code:`text`, :code:`label` or :code:`tokens`) is stored as one
+    list holding the field's values for all instances, and feature
+    vectors are stored in a single 2-D NumPy matrix sharing one list of
+    feature names.
+
+    For compatibility with code that expects a list of dictionaries, a
+    SampleStore can be indexed, sliced, iterated over and extended like
+    a list, where each instance is represented by an
+    :class:`InstanceView` that behaves like a dictionary and reads from
+    and writes to the underlying columns.
+    ::
+        store = SampleStore.from_dicts([{"text": "text 1", "label": "0"}])
+        store[0]["text"]  # "text 1"
+        store[0]["prediction"] = "0"
+        store.column("prediction")  # ["0"]
+    """
+
+    def __init__(self, columns=None, feature_matrix=None, feature_names=None):
+        """
+        Instantiates a SampleStore from columns.
+
+        :param columns: Dictionary mapping field names to lists holding
+            the field's value for each instance.
+        :type columns: Dict[str, list]
+        :param feature_matrix: 2-D matrix containing the feature vector
+            of each instance as rows.
+        :type feature_matrix: numpy.ndarray
+        :param feature_names: Names of the features, i.e. the columns of
+            :code:`feature_matrix`.
+        :type feature_names: List[str]
+        """
+        columns = columns or {}
+        lengths = {len(values) for values in columns.values()}
+        if feature_matrix is not None:
+            lengths.add(len(feature_matrix))
+        if len(lengths) > 1:
+            raise ValueError(f"All columns of a SampleStore must be of same "
+                             f"length. Column lengths are: {lengths}")
+
+        self._length = lengths.pop() if lengths else 0
+        self._columns = {name: list(values)
+                         for name, values in columns.items()}
+        self.feature_matrix = None
+        self.feature_names = None
+        self._featurized = None
+
+        if feature_matrix is not None:
+            self.set_features(feature_matrix, feature_names)
+
+    @classmethod
+    def from_dicts(cls, dicts):
+        """
+        Builds a SampleStore from a list of dictionaries, where each
+        dictionary represents one instance.
+
+        :param dicts: List of dicts, where each dict represents an
+            instance.
+        :type dicts: Iterable[dict]
+        :return: SampleStore instance.
+        """
+        store = cls()
+        vectors = []
+        for idx, instance in enumerate(dicts):
+            for key, value in instance.items():
+                if key in ("feature_vector", "feature_names"):
+                    continue
+                if key not in store._columns:
+                    store._columns[key] = [_MISSING] * idx
+                store._columns[key].append(value)
+            for column in store._columns.values():
+                if len(column) == idx:
+                    column.append(_MISSING)
+
+            if "feature_vector" in instance:
+                vectors.append(instance["feature_vector"])
+                feature_names = instance.get("feature_names")
+                if store.feature_names is None:
+                    store.feature_names = feature_names
+                elif feature_names != store.feature_names:
+                    raise ValueError("All instances of a SampleStore have to "
+                                     "share the same feature names.")
+            else:
+                vectors.append(None)
+            store._length = idx + 1
+
+        featurized = [vector is not None for vector in vectors]
+        if any(featurized):
+            width = len(next(vector for vector in vectors
+                             if vector is not None))
+            store.feature_matrix = np.full((store._length, width), np.nan)
+            for idx, vector in enumerate(vectors):
+                if vector is not None:
+                    store.feature_matrix[idx] = vector
+            store._featurized = np.array(featurized, dtype=bool)
+
+        return store
+
+    def to_dicts(self):
+        """
+        Converts the SampleStore to a list of dictionaries.
+
+        :return: List of dicts, where each dict represents an instance.
+        """
+        return [dict(instance) for instance in self]
+
+    def column(self, name):
+        """
+        Returns the values of a field for all instances. Instances that
+        don't contain the field have the value :code:`None`.
+
+        :param name: Name of the field.
+        :type name: str
+        :return: List containing the field's values.
+        """
+        if name not in self._columns:
+            raise KeyError(name)
+        return [None if value is _MISSING else value
+                for value in self._columns[name]]
+
+    def set_column(self, name, values):
+        """
+        Sets the values of a field for all instances at once.
+
+        :param name: Name of the field.
+        :type name: str
+        :param values: Value of the field for each instance.
+        :type values: list
+        """
+        if name in ("feature_vector", "feature_names"):
+            raise ValueError(f"Use set_features to set '{name}'.")
+        if len(values) != self._length:
+            raise ValueError(f"Column has to contain {self._length} values. "
+                             f"Number of values is: {len(values)}")
+        self._columns[name] = list(values)
+
+    def delete_column(self, name):
+        """
+        Removes a field from all instances, if it exists.
+
+        :param name: Name of the field.
+        :type name: str
+        """
+        if name in ("feature_vector", "feature_names"):
+            raise ValueError(f"Use set_features to set '{name}'.")
+        self._columns.pop(name, None)
+
+    def is_featurized(self):
+        """
+        Returns whether a feature vector has been set for each instance.
+
+        :return: Boolean array of length :code:`len(self)`.
+        """
+        if self._featurized is None:
+            return np.zeros(self._length, dtype=bool)
+        return self._featurized.copy()
+
+    def set_features(self, feature_matrix, feature_names):
+        """
+        Sets the feature vectors of all instances at once.
+
+        :param feature_matrix: 2-D matrix containing the feature vector
+            of each instance as rows.
+        :type feature_matrix: numpy.ndarray
+        :param feature_names: Names of the features, i.e. the columns of
+            :code:`feature_matrix`.
+        :type feature_names: List[str]
+        """
+        feature_matrix = np.asanyarray(feature_matrix)
+        if feature_matrix.ndim != 2 or \
+                feature_matrix.shape[0] != self._length:
+            raise ValueError(f"Feature matrix has to be of shape "
+                             f"({self._length}, number of features). Shape "
+                             f"is: {feature_matrix.shape}")
+        if feature_names is not None and \
+                len(feature_names) != feature_matrix.shape[1]:
+            raise ValueError("Number of feature names and number of columns "
+                             "in feature matrix don't match up.")
+
+        self.feature_matrix = feature_matrix
+        self.feature_names = feature_names
+        self._featurized = np.ones(self._length, dtype=bool)
+
+    def take(self, indices):
+        """
+        Returns a new SampleStore containing the instances at the given
+        positions.
+
+        :param indices: Positions of instances to select.
+        :type indices: Iterable[int]
+        :return: SampleStore instance.
+        """
+        indices = list(indices)
+        store = SampleStore()
+        store._length = len(indices)
+        store._columns = {name: [values[idx] for idx in indices]
+                          for name, values in self._columns.items()}
+        if self.feature_matrix is not None:
+            index_array = np.array(indices, dtype=np.intp)
+            store.feature_matrix = self.feature_matrix[index_array]
+            store.feature_names = self.feature_names
+            store._featurized = self._featurized[index_array]
+
+        return store
+
+    def append(self, instance):
+        """
+        Appends an instance to the SampleStore.
+
+        :param instance: Dictionary representing an instance.
+        :type instance: dict
+        """
+        self.extend([instance])
+
+    def extend(self, instances):
+        """
+        Appends multiple instances to the SampleStore.
+
+        :param instances: SampleStore or list of dictionaries.
+        :type instances: Union[SampleStore, List[dict]]
+        """
+        if not isinstance(instances, SampleStore):
+            instances = SampleStore.from_dicts(instances)
+
+        # check the feature vectors before changing anything
+        feature_names = self.feature_names
+        if instances.feature_matrix is not None:
+            if self.feature_matrix is not None and \
+                    instances.feature_matrix.shape[1] != \
+                    self.feature_matrix.shape[1]:
+                raise ValueError("Feature vectors of SampleStores to "
+                                 "concatenate don't match up.")
+            if instances.feature_names is not None:
+                if feature_names is None:
+                    feature_names = instances.feature_names
+                elif instances.feature_names != feature_names:
+                    raise ValueError("Feature vectors of SampleStores to "
+                                     "concatenate don't match up.")
+
+        # columns are extended in place, such that appending instances
+        # one at a time takes amortized constant time
+        length = self._length + len(instances)
+        for name, values in instances._columns.items():
+            if name not in self._columns:
+                self._columns[name] = [_MISSING] * self._length
+            self._columns[name].extend(values)
+        for name, values in self._columns.items():
+            if len(values) < length:
+                values.extend([_MISSING] * (length - len(values)))
+
+        if self.feature_matrix is not None or \
+                instances.feature_matrix is not None:
+            width = (self.feature_matrix if self.feature_matrix is not None
+                     else instances.feature_matrix).shape[1]
+            # rows without a feature vector are filled with NaN
+            dtype = np.result_type(*[
+                np.float64 if store.feature_matrix is None
+                else store.feature_matrix.dtype
+                for store in (self, instances) if len(store)
+            ] or [np.float64])
+            self._grow_features(length, width, dtype)
+            if instances.feature_matrix is not None:
+                self.feature_matrix[self._length:] = \
+                    instances.feature_matrix
+                self._featurized[self._length:] = instances.is_featurized()
+            self.feature_names = feature_names
+
+        self._length = length
+
+    def _grow_features(self, length, width, dtype):
+        # Grows feature matrix and featurized mask to the given number of
+        # rows. Both are views on buffers that grow geometrically, and
+        # new rows are unfeaturized.
+        buffer = self.__dict__.get("_feature_buffer")
+        if buffer is None or self.feature_matrix is None or \
+                self.feature_matrix.base is not buffer or \
+                len(buffer) < length or buffer.dtype != dtype:
+            capacity = max(length, 2 * self._length, 16)
+            buffer = np.full((capacity, width), np.nan, dtype=dtype)
+            featurized_buffer = np.zeros(capacity, dtype=bool)
+            if self.feature_matrix is not None:
+                buffer[:self._length] = self.feature_matrix
+                featurized_buffer[:self._length] = self.is_featurized()
+            self._feature_buffer = buffer
+            self._featurized_buffer = featurized_buffer
+
+        self.feature_matrix = buffer[:length]
+        self.feature_matrix[self._length:] = np.nan
+        self._featurized = self._featurized_buffer[:length]
+        self._featurized[self._length:] = False
+
+    @classmethod
+    def concatenate(cls, stores):
+        """
+        Concatenates multiple SampleStores into a new SampleStore,
+        keeping the order of the instances. Rows of instances without
+        a feature vector are filled with NaN in the feature matrix.
+
+        :param stores: SampleStores to concatenate.
+        :type stores: List[SampleStore]
+        :return: SampleStore instance.
+        """
+        result = cls()
+        result._length = sum(len(store) for store in stores)
+
+        featurized_stores = [store for store in stores
+                             if store.feature_matrix is not None]
+        if featurized_stores:
+            width = featurized_stores[0].feature_matrix.shape[1]
+            result.feature_names = next(
+                (store.feature_names for store in featurized_stores
+                 if store.feature_names is not None), None)
+            for store in featurized_stores:
+                if store.feature_matrix.shape[1] != width or \
+                        (store.feature_names is not None and
+                         store.feature_names != result.feature_names):
+                    raise ValueError("Feature vectors of SampleStores to "
+                                     "concatenate don't match up.")
+            result.feature_matrix = np.concatenate([
+                store.feature_matrix if store.feature_matrix is not None
+                else np.full((len(store), width), np.nan)
+                for store in stores
+            ])
+            result._featurized = np.concatenate([store.is_featurized()
+                                                 for store in stores])
+
+        names = []
+        for store in stores:
+            names += [name for name in store._columns if name not in names]
+        for name in names:
+            column = []
+            for store in stores:
+                column += store._columns.get(name, [_MISSING] * len(store))
+            result._columns[name] = column
+
+        return result
+
+    def __getstate__(self):
+        # the spare rows of the feature buffers are not pickled
+        state = self.__dict__.copy()
+        state.pop("_feature_buffer", None)
+        state.pop("_featurized_buffer", None)
+        return state
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return self.take(range(self._length)[idx])
+        if idx < 0:
+            idx += self._length
+        if not 0 <= idx < self._length:
+            raise IndexError("SampleStore index out of range")
+        return InstanceView(self, idx)
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __add__(self, other):
+        store = self.take(range(self._length))
+        store.extend(other)
+        return store
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and \
+            all(instance == other_instance
+                for instance, other_instance in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"SampleStore({self.to_dicts()!r})"
+
+    def _get_value(self, idx, key):
+        if key == "feature_vector":
+            if self._featurized is not None and self._featurized[idx]:
+                return self.feature_matrix[idx].tolist()
+            raise KeyError(key)
+        if key == "feature_names":
+            if self._featurized is not None and self._featurized[idx]:
+                return self.feature_names
+            raise KeyError(key)
+
+        values = self._columns.get(key)
+        if values is None or values[idx] is _MISSING:
+            raise KeyError(key)
+        return values[idx]
+
+    def _set_value(self, idx, key, value):
+        if key == "feature_vector":
+            if self.feature_matrix is None:
+                self.feature_matrix = np.full((self._length, len(value)),
+                                              np.nan)
+                self._featurized = np.zeros(self._length, dtype=bool)
+            if len(value) != self.feature_matrix.shape[1]:
+                raise ValueError("All instances of a SampleStore have to "
+                                 "share the same number of features.")
+            self.feature_matrix[idx] = value
+            self._featurized[idx] = True
+        elif key == "feature_names":
+            if self.feature_names is None:
+                self.feature_names = value
+            elif value != self.feature_names:
+                raise ValueError("All instances of a SampleStore have to "
+                                 "share the same feature names.")
+        else:
+            if key not in self._columns:
+                self._columns[key] = [_MISSING] * self._length
+            self._columns[key][idx] = value
+
+    def _delete_value(self, idx, key):
+        if key in ("feature_vector", "feature_names"):
+            if self._featurized is None or not self._featurized[idx]:
+                raise KeyError(key)
+            self._featurized[idx] = False
+        else:
+            if key not in self._columns or \
+                    self._columns[key][idx] is _MISSING:
+                raise KeyError(key)
+            self._columns[key][idx] = _MISSING
+
+    def _instance_keys(self, idx):
+        for name, values in self._columns.items():
+            if values[idx] is not _MISSING:
+                yield name
+        if self._featurized is not None and self._featurized[idx]:
+            yield "feature_vector"
+            if self.feature_names is not None:
+                yield "feature_names"
+
+
+class InstanceView(MutableMapping):
+    """
+    Dictionary-like view on a single instance of a
+    :class:`SampleStore`. Reading and writing keys reads from and
+    writes to the columns of the underlying SampleStore.
+    """
+
+    __slots__ = ("_store", "_idx")
+
+    def __init__(self, store, idx):
+        self._store = store
+        self._idx = idx
+
+    def __getitem__(self, key):
+        return self._store._get_value(self._idx, key)
+
+    def __setitem__(self, key, value):
+        self._store._set_value(self._idx, key, value)
+
+    def __delitem__(self, key):
+        self._store._delete_value(self._idx, key)
+
+    def __iter__(self):
+        return self._store._instance_keys(self._idx)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
@@ -0,0 +1,285 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from types import SimpleNamespace
+import functools
+import time
+import tracemalloc
+
+
+class Profiler:
+    """
+    Opt-in instrumentation that measures wall time, CPU time, number of
+    processed instances and, optionally, peak memory of the stages of
+    a text classification pipeline, e.g. reading data, running spaCy,
+    each feature function, training and making predictions.
+
+    A Profiler is passed to the methods to instrument using their
+    :code:`profiler` parameter. The collected measurements are
+    available in :attr:`metrics` and can be passed to a callback after
+    each stage.
+    ::
+        profiler = Profiler(trace_memory=True)
+        preprocessor = CSVPreprocessor("train.tsv", profiler=profiler)
+        featurizer.extract_features(preprocessor, profiler=profiler)
+        classifier.train(preprocessor, profiler=profiler)
+        print(profiler.report())
+    """
+
+    enabled = True
+
+    def __init__(self, trace_memory=False, callback=None):
+        """
+        Instantiates a Profiler.
+
+        :param trace_memory: Whether to measure the peak memory
+            allocated during each stage using :code:`tracemalloc`.
+            Tracing memory slows down execution considerably. On Python
+            versions before 3.9, if tracing was started before the
+            profiler is used, the peak of a stage includes the peak
+            reached before the stage started.
+        :type trace_memory: bool
+        :param callback: Function called with the name of a stage and
+            the measurements of this run of the stage each time a stage
+            created with :meth:`stage` finishes.
+        :type callback: function
+        """
+        self.trace_memory = trace_memory
+        self.callback = callback
+        self._metrics = defaultdict(lambda: {"calls": 0, "wall_time": 0.0,
+                                             "cpu_time": 0.0, "instances": 0,
+                                             "peak_memory": None})
+        # memory at start and peak memory of the stages currently
+        # running, outermost first
+        self._memory_stack = []
+        self._started_tracing = False
+        # memory of traces cleared to reset the peak, see _reset_peak
+        self._cleared_memory = 0
+
+    @property
+    def metrics(self):
+        """
+        Dictionary mapping each stage name to a dictionary with the
+        number of calls, total wall and CPU time in seconds, number of
+        processed instances, throughput in instances per second and
+        peak memory in bytes (None if memory isn't traced).
+        """
+        metrics = {}
+        for name, stage_metrics in self._metrics.items():
+            metrics[name] = dict(stage_metrics)
+            metrics[name]["instances_per_second"] = \
+                _throughput(stage_metrics["instances"],
+                            stage_metrics["wall_time"])
+        return metrics
+
+    @contextmanager
+    def stage(self, name, instances=0):
+        """
+        Context manager measuring the code run inside it as one run of
+        a stage. Stages can be nested. The context manager yields an
+        object whose attribute :code:`instances` can be set if the
+        number of processed instances is only known inside the stage.
+
+        :param name: Name of the stage, e.g. "train".
+        :type name: str
+        :param instances: Number of instances processed in the stage.
+        :type instances: int
+        """
+        stage_run = SimpleNamespace(instances=instances)
+        if self.trace_memory:
+            self._start_memory_trace()
+        start_wall_time = time.perf_counter()
+        start_cpu_time = time.process_time()
+        try:
+            yield stage_run
+        finally:
+            wall_time = time.perf_counter() - start_wall_time
+            cpu_time = time.process_time() - start_cpu_time
+            instances = stage_run.instances
+            peak_memory = None
+            if self.trace_memory:
+                peak_memory = self._stop_memory_trace()
+            self._record(name, wall_time, cpu_time, instances, peak_memory)
+
+            if self.callback is not None:
+                self.callback(name, {
+                    "wall_time": wall_time,
+                    "cpu_time": cpu_time,
+                    "instances": instances,
+                    "instances_per_second": _throughput(instances, wall_time),
+                    "peak_memory": peak_memory,
+                })
+
+    def wrap(self, name, function):
+        """
+        Wraps a function processing one instance per call, such that
+        the time spent in all calls is recorded as a stage.
+
+        :param name: Name of the stage.
+        :type name: str
+        :param function: Function to measure.
+        :type function: function
+        :return: Wrapped function.
+        """
+        @functools.wraps(function)
+        def profiled_function(*args, **kwargs):
+            start_wall_time = time.perf_counter()
+            start_cpu_time = time.process_time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._record(name, time.perf_counter() - start_wall_time,
+                             time.process_time() - start_cpu_time, 1)
+
+        return profiled_function
+
+    def iterate(self, name, iterable):
+        """
+        Wraps an iterable yielding one item per instance, such that the
+        time spent producing the items is recorded as a stage, e.g. for
+        lazily computed spaCy annotations.
+
+        :param name: Name of the stage.
+        :type name: str
+        :param iterable: Iterable to measure.
+        :type iterable: Iterable
+        :return: Generator yielding the items of the iterable.
+        """
+        iterator = iter(iterable)
+        try:
+            while True:
+                start_wall_time = time.perf_counter()
+                start_cpu_time = time.process_time()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    self._record(name, time.perf_counter() - start_wall_time,
+                                 time.process_time() - start_cpu_time, 0,
+                                 calls=0)
+                    return
+                self._record(name, time.perf_counter() - start_wall_time,
+                             time.process_time() - start_cpu_time, 1)
+                yield item
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+
+    def report(self):
+        """
+        Returns a table summarizing the measurements of all stages.
+
+        :return: str
+        """
+        lines = [f"{'stage':<40}{'calls':>8}{'wall [s]':>12}{'cpu [s]':>12}"
+                 f"{'inst/s':>12}{'peak [MB]':>12}"]
+        for name, stage_metrics in self.metrics.items():
+            throughput = "-"
+            if stage_metrics["instances_per_second"] is not None:
+                throughput = f"{stage_metrics['instances_per_second']:.1f}"
+            peak_memory = "-"
+            if stage_metrics["peak_memory"] is not None:
+                peak_memory = f"{stage_metrics['peak_memory'] / 2**20:.1f}"
+            lines.append(f"{name:<40}{stage_metrics['calls']:>8}"
+                         f"{stage_metrics['wall_time']:>12.3f}"
+                         f"{stage_metrics['cpu_time']:>12.3f}"
+                         f"{throughput:>12}{peak_memory:>12}")
+        return "\n".join(lines)
+
+    def reset(self):
+        """
+        Removes all measurements.
+        """
+        self._metrics.clear()
+
+    def _record(self, name, wall_time, cpu_time, instances,
+                peak_memory=None, calls=1):
+        stage_metrics = self._metrics[name]
+        stage_metrics["calls"] += calls
+        stage_metrics["wall_time"] += wall_time
+        stage_metrics["cpu_time"] += cpu_time
+        stage_metrics["instances"] += instances
+        if peak_memory is not None:
+            stage_metrics["peak_memory"] = max(
+                stage_metrics["peak_memory"] or 0, peak_memory)
+
+    def _start_memory_trace(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        current_memory, peak_memory = self._get_traced_memory()
+        # the peak of the enclosing stage has to be kept before resetting
+        # the peak for this stage
+        if self._memory_stack:
+            self._memory_stack[-1][1] = max(self._memory_stack[-1][1],
+                                            peak_memory)
+        self._reset_peak(current_memory)
+        self._memory_stack.append([current_memory, current_memory])
+
+    def _stop_memory_trace(self):
+        start_memory, peak_memory = self._memory_stack.pop()
+        peak_memory = max(peak_memory, self._get_traced_memory()[1])
+        if self._memory_stack:
+            self._memory_stack[-1][1] = max(self._memory_stack[-1][1],
+                                            peak_memory)
+        elif self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+            self._cleared_memory = 0
+
+        return peak_memory - start_memory
+
+    def _get_traced_memory(self):
+        # Returns current and peak traced memory, including the memory of
+        # traces cleared to reset the peak.
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+        return current_memory + self._cleared_memory, \
+            peak_memory + self._cleared_memory
+
+    def _reset_peak(self, current_memory):
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        elif self._started_tracing:
+            # tracemalloc.reset_peak is only available from Python 3.9 on,
+            # before that the peak can only be reset by clearing all
+            # traces, which is only done if the profiler started tracing
+            tracemalloc.clear_traces()
+            self._cleared_memory = current_memory
+
+
+class NullProfiler(Profiler):
+    """
+    Profiler that doesn't measure anything. It is used if no profiler
+    is passed, such that instrumented code doesn't have to check
+    whether profiling is enabled.
+    """
+
+    enabled = False
+
+    def __init__(self):
+        super().__init__()
+
+    @contextmanager
+    def stage(self, name, instances=0):
+        yield SimpleNamespace(instances=instances)
+
+    def wrap(self, name, function):
+        return function
+
+    def iterate(self, name, iterable):
+        return iterable
+
+
+def get_profiler(profiler=None):
+    """
+    Returns the given profiler or a :class:`NullProfiler` if it is None.
+
+    :param profiler: Profiler or None.
+    :type profiler: Profiler
+    :return: Profiler
+    """
+    return NullProfiler() if profiler is None else profiler
+
+
+def _throughput(instances, wall_time):
+    if not instances or wall_time <= 0:
+        return None
+    return instances / wall_time
@@ -0,0 +1,34 @@
+import multiprocessing
+import os
+
+
+def available_cpus():
+    """
+    Returns the number of CPUs this process may use, taking CPU affinity
+    and cgroup CPU quotas of containers into account.
+
+    :return: int
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = multiprocessing.cpu_count()
+
+    quota_files = [("/sys/fs/cgroup/cpu.max", None),
+                   ("/sys/fs/cgroup/cpu/cpu.cfs_quota_us",
+                    "/sys/fs/cgroup/cpu/cpu.cfs_period_us")]
+    for quota_file, period_file in quota_files:
+        try:
+            with open(quota_file) as file:
+                values = file.read().split()
+            if period_file is not None:
+                with open(period_file) as file:
+                    values.append(file.read().strip())
+            quota, period = values[0], values[1]
+            if quota not in ("max", "-1"):
+                cpus = min(cpus, max(1, int(quota) // int(period)))
+            break
+        except (OSError, ValueError, IndexError):
+            continue
+
+    return cpus